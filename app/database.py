@@ -1,4 +1,7 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -21,18 +24,71 @@ else:
 
 print(f"INFO: Using database URL: {SQLALCHEMY_DATABASE_URL}")
 
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+
 # connect_args is only valid for SQLite
-_connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+_connect_args = {"check_same_thread": False} if IS_SQLITE else {}
+
+# --- SQLITE PROFILE ---
+# "production" (the default) puts every connection in WAL mode, so readers
+# never block the writer and several workers can share the file without
+# "database is locked" errors; writers queue for up to SQLITE_BUSY_TIMEOUT_MS
+# instead of failing. "default" leaves SQLite's own settings alone.
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "production")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # NORMAL is durable in WAL mode except on power loss
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))  # per connection
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+
+def _apply_sqlite_profile(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
 
 # Create the SQLAlchemy engine
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=_connect_args)
 
+if IS_SQLITE and SQLITE_PROFILE == "production":
+    event.listen(engine, "connect", _apply_sqlite_profile)
+
 # Create a SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# --- ASYNC ENGINE ---
+# The busiest `async def` routes query through this engine so they never block
+# the event loop (and with it every WebSocket on the worker). SQLite goes
+# through aiosqlite; for other databases set ASYNC_DATABASE_URL to a URL with
+# an async driver.
+def _async_database_url(url: str):
+    parsed = make_url(url)
+    if parsed.drivername in ("sqlite", "sqlite+pysqlite"):
+        return parsed.set(drivername="sqlite+aiosqlite")
+    return parsed
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_database_url(SQLALCHEMY_DATABASE_URL)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, connect_args=_connect_args)
+if IS_SQLITE and SQLITE_PROFILE == "production":
+    event.listen(async_engine.sync_engine, "connect", _apply_sqlite_profile)
+
+# Objects stay usable after commit: templates render them once the
+# request's awaits are done and can't lazy-load anything.
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Base class for our models
 Base = declarative_base()
 
+
+def insert_for(db):
+    """The dialect's insert() for a sync or async session, for statements that need ON CONFLICT."""
+    return postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+
 # Dependency to get the database session
 def get_db():
     db = SessionLocal()
@@ -40,3 +96,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Async variant, for `async def` routes
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: maintenance is left to SQLite's defaults
+    fcntl = None
+
+from app.database import IS_SQLITE, SQLITE_PROFILE, engine
+
+# --- SQLITE MAINTENANCE ---
+# One worker (whichever holds the lock file) checkpoints the WAL back into the
+# database file and keeps the query planner's statistics fresh. The work runs
+# in a thread so the event loop never waits on it.
+SQLITE_CHECKPOINT_INTERVAL = float(os.getenv("SQLITE_CHECKPOINT_INTERVAL", "60"))
+# Past this size the WAL is truncated back to zero after checkpointing.
+SQLITE_WAL_TRUNCATE_BYTES = int(os.getenv("SQLITE_WAL_TRUNCATE_BYTES", str(64 * 1024 * 1024)))
+SQLITE_OPTIMIZE_INTERVAL = float(os.getenv("SQLITE_OPTIMIZE_INTERVAL", str(6 * 3600)))
+# Rows ANALYZE looks at per index, so refreshing statistics stays cheap on big tables.
+SQLITE_ANALYSIS_LIMIT = int(os.getenv("SQLITE_ANALYSIS_LIMIT", "1000"))
+
+
+class SQLiteMaintenance:
+    def __init__(self, engine=engine):
+        self.engine = engine
+        self.path = engine.url.database
+        self.lock_file = None
+        self.task = None
+
+    @property
+    def enabled(self) -> bool:
+        return (IS_SQLITE and SQLITE_PROFILE == "production" and fcntl is not None
+                and bool(self.path) and self.path != ":memory:")
+
+    async def start(self):
+        if self.enabled:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+        if self.lock_file:
+            self.lock_file.close()
+            self.lock_file = None
+
+    def _is_leader(self) -> bool:
+        # Retried every round, so another worker takes over if the holder exits.
+        if self.lock_file is not None:
+            return True
+        lock_file = open(self.path + ".maintenance.lock", "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.lock_file = lock_file
+        print(f"INFO: Worker {os.getpid()} is running SQLite maintenance for {self.path}")
+        return True
+
+    async def _run(self):
+        next_optimize = time.monotonic()
+        while True:
+            await asyncio.sleep(SQLITE_CHECKPOINT_INTERVAL)
+            if not self._is_leader():
+                continue
+            try:
+                await asyncio.to_thread(self.checkpoint)
+                if time.monotonic() >= next_optimize:
+                    await asyncio.to_thread(self.optimize)
+                    next_optimize = time.monotonic() + SQLITE_OPTIMIZE_INTERVAL
+            except Exception as e:
+                print(f"WARNING: SQLite maintenance failed: {e}")
+
+    def checkpoint(self):
+        """Copy committed WAL pages back into the database; returns (busy, wal pages, pages copied)."""
+        wal_path = self.path + "-wal"
+        too_big = os.path.exists(wal_path) and os.path.getsize(wal_path) > SQLITE_WAL_TRUNCATE_BYTES
+        # PASSIVE never waits on readers or writers; TRUNCATE waits (up to the
+        # busy timeout) so the file can be reset.
+        mode = "TRUNCATE" if too_big else "PASSIVE"
+        with self.engine.connect() as conn:
+            busy, wal_pages, copied = conn.exec_driver_sql(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        if busy or (wal_pages > 0 and copied < wal_pages):
+            print(f"INFO: WAL checkpoint ({mode}) copied {copied}/{wal_pages} pages; readers are still on older ones")
+        return busy, wal_pages, copied
+
+    def optimize(self):
+        """Re-run ANALYZE on tables whose statistics have gone stale."""
+        with self.engine.connect() as conn:
+            conn.exec_driver_sql(f"PRAGMA analysis_limit={SQLITE_ANALYSIS_LIMIT}")
+            conn.exec_driver_sql("PRAGMA optimize")
+
+
+maintenance = SQLiteMaintenance()
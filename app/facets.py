@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+import time
+import zlib
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.realtime import manager
+
+# --- FACET CACHE ---
+# Artifact counts per (category, era), held in memory by every worker so
+# filter UIs cost no query. Routes that add or remove artifacts record the
+# change with record(); it is applied when the transaction commits and sent
+# to the other workers over the pub/sub relay. The relay is best effort, so
+# each worker also reloads the counts from the database every
+# FACET_RELOAD_INTERVAL seconds.
+FACET_RELOAD_INTERVAL = float(os.getenv("FACET_RELOAD_INTERVAL", "300"))
+FACETS_CHANNEL = "facets"
+PENDING_KEY = "pending_facets"
+
+
+class FacetCache:
+    def __init__(self):
+        self.counts: dict = {}  # {(category, era): artifacts}
+        self.version = None  # changes whenever the counts do; None until loaded
+        self.snapshot = None
+        self.loaded_at = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def stale(self) -> bool:
+        return self.version is None or time.monotonic() - self.loaded_at > FACET_RELOAD_INTERVAL
+
+    def _changed(self):
+        # The version is derived from the counts rather than a per-worker
+        # counter, so every worker holding the same counts reports the same one.
+        content = json.dumps(sorted((c or "", e or "", n) for (c, e), n in self.counts.items()))
+        self.version = format(zlib.crc32(content.encode()), "08x")
+        categories, eras = {}, {}
+        for (category, era), count in self.counts.items():
+            if category:
+                categories[category] = categories.get(category, 0) + count
+            if era:
+                eras[era] = eras.get(era, 0) + count
+        # Built once per change and handed out as-is: treat it as read-only.
+        self.snapshot = {
+            "version": self.version,
+            "facets": [{"category": c, "era": e, "count": n} for (c, e), n in sorted(
+                self.counts.items(), key=lambda item: (item[0][0] or "", item[0][1] or ""))],
+            "categories": dict(sorted(categories.items())),
+            "eras": eras,
+        }
+
+    def _replace(self, rows):
+        with self.lock:
+            self.counts = {(category, era): count for category, era, count in rows}
+            self.loaded_at = time.monotonic()
+            self._changed()
+
+    @staticmethod
+    def _query():
+        return (
+            select(models.Artifact.category, models.Artifact.era, func.count())
+            .group_by(models.Artifact.category, models.Artifact.era)
+        )
+
+    async def load(self, db):
+        result = await db.execute(self._query())
+        self._replace(result.all())
+
+    def apply(self, deltas: list):
+        with self.lock:
+            # Deltas that arrive before the first load are already in what it reads.
+            if self.version is None:
+                return
+            for category, era, delta in deltas:
+                key = (category, era)
+                count = self.counts.get(key, 0) + delta
+                if count > 0:
+                    self.counts[key] = count
+                else:
+                    self.counts.pop(key, None)
+            self._changed()
+
+    def apply_remote(self, message: dict):
+        # The relay never echoes a message back to the worker that sent it.
+        self.apply(message["deltas"])
+
+
+facets = FacetCache()
+
+
+async def current(db) -> dict:
+    """The cached facets, (re)loading them first if they are missing or due a reload."""
+    if facets.stale:
+        await facets.load(db)
+    return facets.snapshot
+
+
+def record(db, artifact: models.Artifact, delta: int):
+    """Count an artifact being added (+1) or removed (-1) once the session commits."""
+    db.info.setdefault(PENDING_KEY, []).append((artifact.category, artifact.era, delta))
+
+
+def start():
+    manager.pubsub.subscribe(FACETS_CHANNEL, facets.apply_remote)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    deltas = session.info.pop(PENDING_KEY, None)
+    if deltas:
+        facets.apply(deltas)
+        manager.publish_threadsafe(FACETS_CHANNEL, {"deltas": deltas})
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session):
+    session.info.pop(PENDING_KEY, None)
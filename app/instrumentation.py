@@ -0,0 +1,173 @@
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+# --- SQL INSTRUMENTATION ---
+# Every statement run while handling a request is counted and timed against
+# that request. "aggregate" (the default) only keeps per-route totals, served
+# at /debug/sql when DEBUG_ENDPOINTS is on; "headers" also reports the numbers
+# on each response as X-DB-* headers, so only set it for local profiling;
+# "off" disables both.
+SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "aggregate")
+# A statement shape run this many times in one request is reported as an N+1 suspect.
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+# Statements slower than this are logged with their parameters and query plan.
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "100"))
+SQL_MAX_SUSPECTS_PER_ROUTE = 5
+SQL_LOG_PARAMETERS_CHARS = 500
+
+_IN_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)|\((?:\s*%\(\w+\)s\s*,)+\s*%\(\w+\)s\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """The statement with whitespace and IN-list lengths normalised, so repeats compare equal."""
+    return _IN_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time", "shapes", "slow")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+        self.slow = 0
+
+    def suspects(self) -> dict:
+        return {shape: count for shape, count in self.shapes.items() if count >= SQL_N_PLUS_ONE_THRESHOLD}
+
+
+# The stats object is shared, not copied, so statements run in the threadpool
+# (sync routes) or in SQLAlchemy's async greenlets still land on the request.
+_current: ContextVar[Optional[RequestStats]] = ContextVar("sql_request_stats", default=None)
+
+# {route: totals}, per worker process.
+route_totals: dict = {}
+
+
+def _explain(conn, cursor, statement: str, parameters) -> list:
+    if not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+        return []
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    # A raw cursor, so explaining doesn't fire these events again.
+    plan_cursor = conn.connection.cursor()
+    try:
+        plan_cursor.execute(prefix + statement, parameters)
+        return [str(row[-1]) for row in plan_cursor.fetchall()]
+    except Exception as e:
+        return [f"(no plan: {e})"]
+    finally:
+        plan_cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+        stats.shapes[statement_shape(statement)] += 1
+    if elapsed * 1000 >= SQL_SLOW_QUERY_MS:
+        if stats is not None:
+            stats.slow += 1
+        plan = [] if executemany else _explain(conn, cursor, statement, parameters)
+        print(f"WARNING: Slow SQL ({elapsed * 1000:.0f} ms): {statement_shape(statement)}\n"
+              f"  parameters: {repr(parameters)[:SQL_LOG_PARAMETERS_CHARS]}"
+              + "".join(f"\n  plan: {line}" for line in plan))
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute.
+    if exception_context.connection is not None and exception_context.cursor is not None:
+        started = exception_context.connection.info.get("query_started")
+        if started:
+            started.pop()
+
+
+def instrument(engine):
+    """Time every statement run on `engine` (pass async engines' sync_engine)."""
+    if SQL_INSTRUMENTATION == "off":
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def _record(route: str, stats: RequestStats) -> dict:
+    totals = route_totals.get(route)
+    if totals is None:
+        totals = route_totals[route] = {
+            "requests": 0, "queries": 0, "db_ms": 0.0, "max_queries": 0,
+            "slow_queries": 0, "n_plus_one_requests": 0, "suspects": {},
+        }
+    totals["requests"] += 1
+    totals["queries"] += stats.queries
+    totals["db_ms"] += stats.db_time * 1000
+    totals["max_queries"] = max(totals["max_queries"], stats.queries)
+    totals["slow_queries"] += stats.slow
+    suspects = stats.suspects()
+    if suspects:
+        totals["n_plus_one_requests"] += 1
+        for shape, count in suspects.items():
+            if shape in totals["suspects"] or len(totals["suspects"]) < SQL_MAX_SUSPECTS_PER_ROUTE:
+                totals["suspects"][shape] = max(count, totals["suspects"].get(shape, 0))
+    return suspects
+
+
+def route_report() -> dict:
+    """Per-route totals, the routes spending the most time in the database first."""
+    report = {}
+    for route, totals in sorted(route_totals.items(), key=lambda item: -item[1]["db_ms"]):
+        report[route] = {
+            **totals,
+            "db_ms": round(totals["db_ms"], 1),
+            "avg_queries": round(totals["queries"] / totals["requests"], 1),
+            "avg_db_ms": round(totals["db_ms"] / totals["requests"], 2),
+        }
+    return report
+
+
+class SQLInstrumentationMiddleware:
+    """Plain ASGI middleware: unlike BaseHTTPMiddleware it adds no task per request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or SQL_INSTRUMENTATION == "off":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and SQL_INSTRUMENTATION == "headers":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(stats.queries).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.db_time * 1000:.1f}".encode()))
+                suspects = stats.suspects()
+                if suspects:
+                    headers.append((b"x-db-n-plus-one", str(max(suspects.values())).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                name = f"{scope['method']} {route.path}"
+                for shape, count in _record(name, stats).items():
+                    print(f"WARNING: Possible N+1 on {name}: {count}x {shape[:200]}")
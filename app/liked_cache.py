@@ -0,0 +1,145 @@
+import os
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.realtime import manager
+
+# --- LIKED-SET CACHE ---
+# Each active user's liked artifact ids, held by every worker as a sorted
+# array of 32-bit ids (4 bytes a like), so "is this liked?" for a card is a
+# binary search instead of a query. Users are evicted least recently used
+# first once the arrays pass LIKED_CACHE_BYTES. The like route records each
+# toggle with record(); it is applied when the transaction commits and sent
+# to the other workers over the pub/sub relay. The relay is best effort, so
+# a user's set is also reread once it is LIKED_CACHE_TTL seconds old.
+LIKED_CACHE_BYTES = int(os.getenv("LIKED_CACHE_BYTES", str(16 * 1024 * 1024)))
+LIKED_CACHE_TTL = float(os.getenv("LIKED_CACHE_TTL", "300"))
+LIKES_CHANNEL = "likes"
+PENDING_KEY = "pending_likes"
+
+
+class LikedCache:
+    def __init__(self, budget: int = LIKED_CACHE_BYTES):
+        self.budget = budget
+        self.users = OrderedDict()  # {user_id: (sorted array of artifact ids, loaded_at)}, least recently used first
+        self.size = 0  # bytes held by the arrays
+        self.loading = {}  # {user_id: True once the set changed while it was being read}
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    async def get(self, db, user_id: int) -> array:
+        """The user's liked artifact ids, sorted; read from the database on a miss."""
+        with self.lock:
+            entry = self.users.get(user_id)
+            if entry and time.monotonic() - entry[1] <= LIKED_CACHE_TTL:
+                self.users.move_to_end(user_id)
+                self.stats["hits"] += 1
+                return entry[0]
+            self.stats["misses"] += 1
+            self.loading.setdefault(user_id, False)
+        # Walks the likes primary key (user_id, artifact_id), so the ids
+        # arrive already sorted.
+        result = await db.execute(
+            select(models.Like.artifact_id).where(models.Like.user_id == user_id).order_by(models.Like.artifact_id)
+        )
+        ids = array("I", result.scalars())
+        with self.lock:
+            # A like or unlike that landed while the ids were being read may
+            # not be in them; use them for this request but don't keep them.
+            if not self.loading.pop(user_id, True):
+                self._store(user_id, ids)
+        return ids
+
+    def _store(self, user_id: int, ids: array):
+        self._drop(user_id)
+        size = sys.getsizeof(ids)
+        if size > self.budget:
+            return
+        self.users[user_id] = (ids, time.monotonic())
+        self.size += size
+        while self.size > self.budget:
+            _, (evicted, _) = self.users.popitem(last=False)
+            self.size -= sys.getsizeof(evicted)
+            self.stats["evictions"] += 1
+
+    def _drop(self, user_id: int):
+        entry = self.users.pop(user_id, None)
+        if entry:
+            self.size -= sys.getsizeof(entry[0])
+
+    def apply(self, changes: list):
+        with self.lock:
+            for user_id, artifact_id, liked in changes:
+                if user_id in self.loading:
+                    self.loading[user_id] = True
+                entry = self.users.get(user_id)
+                if not entry:
+                    continue
+                ids = entry[0]
+                self.size -= sys.getsizeof(ids)
+                i = bisect_left(ids, artifact_id)
+                present = i < len(ids) and ids[i] == artifact_id
+                if liked and not present:
+                    insort(ids, artifact_id)
+                elif not liked and present:
+                    del ids[i]
+                self.size += sys.getsizeof(ids)
+
+    def report(self) -> dict:
+        return {**self.stats, "users": len(self.users), "bytes": self.size, "budget": self.budget}
+
+    def apply_remote(self, message: dict):
+        # The relay never echoes a message back to the worker that sent it.
+        self.apply(message["changes"])
+
+
+liked_cache = LikedCache()
+
+
+def contains(ids: array, artifact_id: int) -> bool:
+    i = bisect_left(ids, artifact_id)
+    return i < len(ids) and ids[i] == artifact_id
+
+
+async def is_liked(db, user: models.User, artifact_id: int) -> bool:
+    if user is None:
+        return False
+    return contains(await liked_cache.get(db, user.id), artifact_id)
+
+
+async def liked_ids(db, user: models.User, artifact_ids: list) -> set:
+    """Which of artifact_ids the user has liked."""
+    if user is None or not artifact_ids:
+        return set()
+    ids = await liked_cache.get(db, user.id)
+    return {artifact_id for artifact_id in artifact_ids if contains(ids, artifact_id)}
+
+
+def record(db, user_id: int, artifact_id: int, liked: bool):
+    """Note a like (True) or unlike (False) to apply once the session commits."""
+    db.info.setdefault(PENDING_KEY, []).append((user_id, artifact_id, liked))
+
+
+def start():
+    manager.pubsub.subscribe(LIKES_CHANNEL, liked_cache.apply_remote)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    changes = session.info.pop(PENDING_KEY, None)
+    if changes:
+        liked_cache.apply(changes)
+        manager.publish_threadsafe(LIKES_CHANNEL, {"changes": changes})
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session):
+    session.info.pop(PENDING_KEY, None)
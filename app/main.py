@@ -1,18 +1,33 @@
-from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi import Depends, FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
-from app import models
+from app.database import engine, async_engine, Base
+from app import facets, liked_cache, models, search
+from app.db_maintenance import maintenance
+from app.instrumentation import SQLInstrumentationMiddleware, instrument, route_report
+from app.realtime import manager
+from app.view_counter import view_counter
 from typing import List
-import json
 import os
 from .routers import auth, artifacts, pages, ai_guide, ai_enrichment, museum
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+search.install(engine)
 
 app = FastAPI(title="Virtual Museum")
 
+# --- DEBUG ENDPOINTS ---
+# /realtime/stats and /debug/sql expose per-worker internals (SQL statement
+# shapes, cache and queue counters) without authentication, so they answer
+# 404 unless DEBUG_ENDPOINTS=on.
+DEBUG_ENDPOINTS = os.getenv("DEBUG_ENDPOINTS", "off") == "on"
+
+
+def require_debug_endpoints():
+    if not DEBUG_ENDPOINTS:
+        raise HTTPException(status_code=404, detail="Not Found")
+
 # --- CORS ---
 # Set ALLOWED_ORIGIN in Railway environment variables for your production frontend URL.
 # Defaults to "*" (open) which is fine while there is no separate frontend domain.
@@ -30,6 +45,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- SQL INSTRUMENTATION ---
+instrument(engine)
+instrument(async_engine.sync_engine)
+app.add_middleware(SQLInstrumentationMiddleware)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 app.mount("/media", StaticFiles(directory="app/media"), name="media")
@@ -42,41 +62,65 @@ app.include_router(pages.router)
 app.include_router(ai_guide.router)
 app.include_router(ai_enrichment.router)
 
-# --- WEBSOCKET MANAGER ---
-class ConnectionManager:
-    def __init__(self):
-        # Store active connections: {room_id: [WebSocket]}
-        self.rooms: dict = {}
-
-    async def connect(self, websocket: WebSocket, room_id: str):
-        await websocket.accept()
-        if room_id not in self.rooms:
-            self.rooms[room_id] = []
-        self.rooms[room_id].append(websocket)
-
-    def disconnect(self, websocket: WebSocket, room_id: str):
-        if room_id in self.rooms:
-            if websocket in self.rooms[room_id]:
-                self.rooms[room_id].remove(websocket)
-            if not self.rooms[room_id]:
-                del self.rooms[room_id]
-
-    async def broadcast(self, message: dict, sender: WebSocket, room_id: str):
-        if room_id in self.rooms:
-            for connection in self.rooms[room_id]:
-                if connection != sender:
-                    await connection.send_text(json.dumps(message))
-
-manager = ConnectionManager()
+@app.on_event("startup")
+async def start_realtime():
+    facets.start()
+    liked_cache.start()
+    await manager.start()
+
+@app.on_event("shutdown")
+async def stop_realtime():
+    await manager.stop()
+
+@app.on_event("startup")
+async def start_database_maintenance():
+    await maintenance.start()
+    await view_counter.start()
+
+@app.on_event("shutdown")
+async def close_database():
+    # Buffered views are written before the engine goes away.
+    await view_counter.stop()
+    await maintenance.stop()
+    await async_engine.dispose()
+
+@app.websocket("/ws")
+async def multiplexed_websocket(websocket: WebSocket):
+    # One socket per client; rooms and other channels are subscribed in-band.
+    username = auth.read_access_token(websocket.cookies.get("access_token"))
+    client = await manager.connect(websocket, username=username)
+    try:
+        await manager.serve(client)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        manager.disconnect(client)
 
 @app.websocket("/ws/museum/{room_id}")
 async def websocket_endpoint(websocket: WebSocket, room_id: str):
+    # Older clients: one socket per room, joined on connect.
     print(f"Attempting connection to room {room_id}")
-    await manager.connect(websocket, room_id)
+    username = auth.read_access_token(websocket.cookies.get("access_token"))
+    client = await manager.connect(websocket, room_id, websocket.query_params.get("resume"), username)
     try:
-        while True:
-            data = await websocket.receive_text()
-            data_json = json.loads(data)
-            await manager.broadcast(data_json, websocket, room_id)
+        await manager.serve(client)
     except WebSocketDisconnect:
-        manager.disconnect(websocket, room_id)
+        pass
+    finally:
+        manager.disconnect(client)
+
+@app.get("/realtime/stats", dependencies=[Depends(require_debug_endpoints)])
+async def realtime_stats():
+    # Counters are per worker process.
+    return {
+        "pid": os.getpid(),
+        "rooms": len(manager.rooms),
+        "clients": sum(len(room.clients) for room in manager.rooms.values()),
+        **manager.stats,
+    }
+
+@app.get("/debug/sql", dependencies=[Depends(require_debug_endpoints)])
+async def sql_stats():
+    # Per worker process, like /realtime/stats.
+    return {"pid": os.getpid(), "routes": route_report(), "view_counter": view_counter.stats,
+            "liked_cache": liked_cache.liked_cache.report()}
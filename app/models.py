@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Float, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Float, Boolean, Index
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, literal_column
 from .database import Base
 
 class User(Base):
@@ -13,6 +13,7 @@ class User(Base):
     bio = Column(Text, nullable=True)
     hashed_password = Column(String)
     museum_theme = Column(String, default="starry") # Personal museum theme
+    unread_notifications_count = Column(Integer, default=0) # kept in step by app/notifications.py
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     artifacts = relationship("Artifact", back_populates="creator")
@@ -34,6 +35,7 @@ class Artifact(Base):
     media_url = Column(String) # URL or file path
     views_count = Column(Integer, default=0)
     likes_count = Column(Integer, default=0)
+    comments_count = Column(Integer, default=0) # kept in step by create_comment
     
     # Personal Museum Placement
     pos_x = Column(Float, default=0.0)
@@ -45,8 +47,50 @@ class Artifact(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # Composite indexes follow the hot query shapes (update_db_indexes.py adds
+    # them to existing databases; check_query_plans.py guards them).
+    __table_args__ = (
+        Index("ix_artifacts_creator_placed", creator_id, is_placed),        # personal museum, inventory
+        Index("ix_artifacts_era_gallery", era, func.coalesce(likes_count, literal_column("0")).desc(), id),  # gallery and tour, by era
+        Index("ix_artifacts_gallery", func.coalesce(likes_count, literal_column("0")).desc(), id),           # gallery, all eras
+        Index("ix_artifacts_created", created_at, id),                       # home feed
+        Index("ix_artifacts_era_created", era, created_at, id),              # home feed, by era
+        Index("ix_artifacts_category_created", category, created_at, id),    # home feed, by category
+        Index("ix_artifacts_category_era", category, era),                   # facet cache reloads
+    )
+
     creator = relationship("User", back_populates="artifacts")
     comments = relationship("Comment", back_populates="artifact")
+    # The normalised form of `tags`, kept in step by app/tags.py.
+    tag_items = relationship("Tag", secondary="artifact_tags", order_by="Tag.name", viewonly=True)
+
+# Gallery and tour order, likes descending: likes_count with NULL counted as
+# no likes, as the like route does. The 0 is part of the SQL text, not a bound
+# parameter, so SQLite matches it to the gallery indexes above.
+gallery_likes = func.coalesce(Artifact.likes_count, literal_column("0"))
+
+class Tag(Base):
+    __tablename__ = "tags"
+
+    id = Column(Integer, primary_key=True, index=True)
+    slug = Column(String, unique=True, index=True) # lower-cased name, used in /?tag= links
+    name = Column(String) # as first written
+    artifacts_count = Column(Integer, default=0) # kept in step by app/tags.py
+
+    __table_args__ = (
+        Index("ix_tags_count", artifacts_count.desc(), slug),               # tag cloud
+    )
+
+class ArtifactTag(Base):
+    __tablename__ = "artifact_tags"
+
+    artifact_id = Column(Integer, ForeignKey("artifacts.id"), primary_key=True)
+    tag_id = Column(Integer, ForeignKey("tags.id"), primary_key=True)
+    created_at = Column(DateTime(timezone=True)) # the artifact's, copied as stored
+
+    __table_args__ = (
+        Index("ix_artifact_tags_tag_created", tag_id, created_at, artifact_id),   # home feed, by tag
+    )
 
 class Comment(Base):
     __tablename__ = "comments"
@@ -57,6 +101,10 @@ class Comment(Base):
     text = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_comments_artifact_created", artifact_id, created_at),
+    )
+
     artifact = relationship("Artifact", back_populates="comments")
     user = relationship("User", back_populates="comments")
 
@@ -66,6 +114,10 @@ class Like(Base):
     user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
     artifact_id = Column(Integer, ForeignKey("artifacts.id"), primary_key=True)
 
+    __table_args__ = (
+        Index("ix_likes_artifact", artifact_id),  # recounting likes_count (reconcile_likes.py)
+    )
+
 class Notification(Base):
     __tablename__ = "notifications"
 
@@ -76,12 +128,25 @@ class Notification(Base):
     type = Column(String) # "like", "comment", "collect"
     message = Column(String)
     is_read = Column(Boolean, default=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    actor_count = Column(Integer, default=1) # senders merged into this row (app/notifications.py)
+    created_at = Column(DateTime(timezone=True), server_default=func.now()) # latest activity
+
+    __table_args__ = (
+        Index("ix_notifications_recipient_created", recipient_id, created_at),
+        Index("ix_notifications_coalesce", recipient_id, artifact_id, type, created_at),  # finding a row to merge into
+    )
 
     recipient = relationship("User", foreign_keys=[recipient_id], backref="notifications_received")
     sender = relationship("User", foreign_keys=[sender_id], backref="notifications_sent")
     artifact = relationship("Artifact")
 
+class NotificationActor(Base):
+    """One sender merged into a coalesced notification, so a repeat sender isn't counted twice."""
+    __tablename__ = "notification_actors"
+
+    notification_id = Column(Integer, ForeignKey("notifications.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+
 class Collection(Base):
     __tablename__ = "collections"
 
@@ -98,6 +163,10 @@ class Collection(Base):
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_collections_user_approved", user_id, is_approved),
+    )
+
     user = relationship("User", backref="collections")
     artifact = relationship("Artifact", backref="collected_by")
 
@@ -0,0 +1,195 @@
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import String, case, cast, delete, event, func, insert, inspect, literal, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import insert_for
+from app.realtime import manager, user_channel
+
+# Notifications added through notify() wait in session.info until the
+# transaction commits, so nobody is told about a like that was rolled back.
+PENDING_KEY = "pending_notifications"
+
+# User.unread_notifications_count is stored, so the badge costs no query. The
+# mapper events below keep it in step with every notification the ORM adds,
+# marks read or deletes; bulk statements go through mark_read() instead.
+
+# --- COALESCING ---
+# A like or comment on an artifact is merged into the recipient's newest
+# unread notification of the same type on that artifact, if it saw activity
+# within NOTIFICATION_COALESCE_WINDOW seconds: "alice and 312 others liked
+# your artifact ...". A viral artifact then costs each recipient one row, not
+# thousands. notification_actors records who is already counted in an unread
+# row, so someone who likes, unlikes and likes again only moves it back to the
+# top; a row's actors are dropped once it is read and can't be merged into.
+NOTIFICATION_COALESCE_WINDOW = float(os.getenv("NOTIFICATION_COALESCE_WINDOW", "3600"))
+# {type: what a merged row says they did}. A merged comment row doesn't quote
+# any one comment, since it stands for several.
+COALESCED_MESSAGES = {"like": "liked your artifact", "comment": "commented on your artifact"}
+
+
+def notify(db, recipient: models.User, sender: models.User, type: str, message: str,
+           artifact_id: int = None) -> models.Notification:
+    """Add a notification to the session; it is pushed to the recipient's live connections on commit."""
+    notification = models.Notification(
+        recipient_id=recipient.id,
+        sender_id=sender.id,
+        artifact_id=artifact_id,
+        type=type,
+        message=message
+    )
+    db.add(notification)
+    payload = {
+        "type": type,
+        "message": message,
+        "artifact_id": artifact_id,
+        "sender": sender.username,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+    }
+    db.info.setdefault(PENDING_KEY, []).append((notification, recipient.username, payload))
+    return notification
+
+
+def push(username: str, message: dict):
+    """Send a message to every connection subscribed to the user's notifications channel."""
+    manager.publish_threadsafe(user_channel(username), message)
+
+
+def _unread_by(delta):
+    unread = func.coalesce(models.User.unread_notifications_count, 0) + delta
+    return case((unread > 0, unread), else_=0)
+
+
+def _adjust_unread(connection, user_id: int, delta: int):
+    connection.execute(
+        update(models.User.__table__).where(models.User.__table__.c.id == user_id)
+        .values(unread_notifications_count=_unread_by(delta))
+    )
+
+
+def _drop_actors(connection, notification_ids):
+    connection.execute(
+        delete(models.NotificationActor.__table__)
+        .where(models.NotificationActor.__table__.c.notification_id.in_(notification_ids))
+    )
+
+
+def mark_read(db: Session, user: models.User, up_to: int = None) -> int:
+    """Mark the user's unread notifications (those with id <= up_to, if given) read; returns the new unread count."""
+    unread = [models.Notification.recipient_id == user.id, models.Notification.is_read == False]
+    if up_to is not None:
+        unread.append(models.Notification.id <= up_to)
+    # Before marking, while the same filter still picks out these rows.
+    _drop_actors(db, select(models.Notification.id).where(*unread).scalar_subquery())
+    query = update(models.Notification).where(*unread)
+    marked = db.execute(query.values(is_read=True).execution_options(synchronize_session=False)).rowcount
+    # Less what was marked rather than zero: a notification that arrived
+    # meanwhile is still unread and still counted.
+    return db.execute(
+        update(models.User).where(models.User.id == user.id)
+        .values(unread_notifications_count=_unread_by(-marked))
+        .returning(models.User.unread_notifications_count)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+
+
+@event.listens_for(models.Notification, "after_insert")
+def _count_new(mapper, connection, notification):
+    if not notification.is_read:
+        _adjust_unread(connection, notification.recipient_id, 1)
+    if notification.type in COALESCED_MESSAGES:
+        # Its first sender, for _coalesce to recognise.
+        connection.execute(insert(models.NotificationActor.__table__)
+                           .values(notification_id=notification.id, user_id=notification.sender_id))
+
+
+@event.listens_for(models.Notification, "after_update")
+def _count_read(mapper, connection, notification):
+    history = inspect(notification).attrs.is_read.history
+    if history.has_changes() and bool(history.deleted and history.deleted[0]) != bool(notification.is_read):
+        _adjust_unread(connection, notification.recipient_id, -1 if notification.is_read else 1)
+        if notification.is_read and notification.type in COALESCED_MESSAGES:
+            _drop_actors(connection, [notification.id])
+
+
+@event.listens_for(models.Notification, "after_delete")
+def _count_deleted(mapper, connection, notification):
+    if not notification.is_read:
+        _adjust_unread(connection, notification.recipient_id, -1)
+
+
+# Registered on Session itself so they also fire for AsyncSession, which
+# runs a Session underneath.
+@event.listens_for(Session, "before_flush")
+def _coalesce(session, flush_context, instances):
+    table = models.Notification.__table__
+    for notification, _, payload in session.info.get(PENDING_KEY, ()):
+        if (notification not in session.new or notification.type not in COALESCED_MESSAGES
+                or notification.artifact_id is None):
+            continue
+        connection = session.connection()
+        latest = connection.execute(
+            select(table.c.id)
+            .where(table.c.recipient_id == notification.recipient_id,
+                   table.c.artifact_id == notification.artifact_id,
+                   table.c.type == notification.type,
+                   table.c.is_read == False,
+                   table.c.created_at >= datetime.utcnow() - timedelta(seconds=NOTIFICATION_COALESCE_WINDOW))
+            .order_by(table.c.created_at.desc())
+            .limit(1)
+        ).scalar()
+        if latest is None:
+            continue
+        new_actor = connection.execute(
+            insert_for(session)(models.NotificationActor)
+            .values(notification_id=latest, user_id=notification.sender_id)
+            .on_conflict_do_nothing()
+        ).rowcount
+        others = func.coalesce(table.c.actor_count, 1)
+        # A repeat sender isn't counted again. If they are the only one, the
+        # row takes their newest message (a comment's latest text).
+        changes = {"created_at": func.now(),
+                   "message": case((others == 1, literal(notification.message)), else_=table.c.message)}
+        if new_actor:
+            # SET reads the row's values from before the update, so the old
+            # actor_count is the number of others.
+            title = select(models.Artifact.title).where(models.Artifact.id == table.c.artifact_id).scalar_subquery()
+            changes.update(
+                sender_id=notification.sender_id,
+                actor_count=others + 1,
+                message=literal(f"{payload['sender']} and ") + cast(others, String)
+                + case((others == 1, " other "), else_=" others ")
+                + literal(f"{COALESCED_MESSAGES[notification.type]} '") + func.coalesce(title, "") + literal("'"),
+            )
+        merged = connection.execute(
+            update(table).where(table.c.id == latest, table.c.is_read == False)
+            .values(**changes).returning(table.c.id, table.c.message)
+        ).first()
+        if merged is None:
+            # Read meanwhile: this one is inserted as a new notification.
+            if new_actor:
+                _drop_actors(connection, [latest])
+            continue
+        # Already counted as unread: the row just moves back to the top.
+        session.expunge(notification)
+        payload.update(id=merged.id, message=merged.message, coalesced=True)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _record_ids(session, flush_context):
+    for notification, _, payload in session.info.get(PENDING_KEY, ()):
+        if notification.id is not None:
+            payload["id"] = notification.id
+
+
+@event.listens_for(Session, "after_commit")
+def _push_pending(session):
+    for _, username, payload in session.info.pop(PENDING_KEY, ()):
+        push(username, {"type": "notification", "notification": payload})
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session):
+    session.info.pop(PENDING_KEY, None)
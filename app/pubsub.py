@@ -0,0 +1,217 @@
+import asyncio
+import json
+import os
+import struct
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the local backend is available
+    fcntl = None
+
+# --- PUB/SUB BACKEND ---
+# Carries room traffic between worker processes. "local" keeps everything in
+# this process (single worker / development). "unix" relays through a broker
+# on a Unix domain socket that one of the workers hosts, so a multi-worker
+# deployment on one machine needs no outside service.
+WS_PUBSUB_BACKEND = os.getenv("WS_PUBSUB_BACKEND", "local")
+WS_PUBSUB_SOCKET = os.getenv("WS_PUBSUB_SOCKET", "/tmp/virtual_museum_ws.sock")
+
+RECONNECT_DELAY = 0.5
+# A worker that stops reading is skipped rather than buffered without bound.
+BROKER_MAX_BUFFER = 4 * 1024 * 1024
+
+OP_SUBSCRIBE = 1
+OP_UNSUBSCRIBE = 2
+OP_PUBLISH = 3
+
+# Frame: u32 body length, u8 op, u16 channel length, then channel + payload.
+FRAME_HEADER = struct.Struct("<IBH")
+
+
+def encode_frame(op: int, channel: str, payload: bytes = b"") -> bytes:
+    channel_bytes = channel.encode()
+    return FRAME_HEADER.pack(len(channel_bytes) + len(payload), op, len(channel_bytes)) + channel_bytes + payload
+
+
+async def read_frame(reader: asyncio.StreamReader):
+    """Returns (op, channel, payload, raw frame)."""
+    header = await reader.readexactly(FRAME_HEADER.size)
+    length, op, channel_length = FRAME_HEADER.unpack(header)
+    body = await reader.readexactly(length)
+    return op, body[:channel_length].decode(), body[channel_length:], header + body
+
+
+class PubSub:
+    """
+    Delivers messages published on a channel to the *other* processes that
+    subscribed to it. Local delivery is the caller's job.
+    """
+
+    # Called whenever the link to the other processes is (re)established, so
+    # subscribers can ask for state they may have missed.
+    on_connect = None
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def subscribe(self, channel: str, handler):
+        pass
+
+    def unsubscribe(self, channel: str):
+        pass
+
+    def publish(self, channel: str, message: dict):
+        pass
+
+
+class LocalPubSub(PubSub):
+    """Single process: there is nobody else to deliver to."""
+
+
+class UnixSocketBroker:
+    """Relays published frames between worker connections on a Unix socket."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.subscribers: dict = {}  # {channel: {StreamWriter}}
+        self.server = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._handle, path=self.path)
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        channels = set()
+        try:
+            while True:
+                op, channel, _, raw = await read_frame(reader)
+                if op == OP_SUBSCRIBE:
+                    self.subscribers.setdefault(channel, set()).add(writer)
+                    channels.add(channel)
+                elif op == OP_UNSUBSCRIBE:
+                    self._drop(channel, writer)
+                    channels.discard(channel)
+                elif op == OP_PUBLISH:
+                    # Forward the frame as-is; the broker never decodes payloads.
+                    for subscriber in list(self.subscribers.get(channel, ())):
+                        if subscriber is writer:
+                            continue
+                        if subscriber.transport.get_write_buffer_size() > BROKER_MAX_BUFFER:
+                            continue
+                        subscriber.write(raw)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for channel in channels:
+                self._drop(channel, writer)
+            writer.close()
+
+    def _drop(self, channel: str, writer: asyncio.StreamWriter):
+        subscribers = self.subscribers.get(channel)
+        if subscribers is not None:
+            subscribers.discard(writer)
+            if not subscribers:
+                del self.subscribers[channel]
+
+
+class UnixSocketPubSub(PubSub):
+    """
+    Worker side of the Unix socket relay. Whichever worker grabs the lock file
+    first hosts the broker; if it dies, the survivors re-elect and reconnect.
+    """
+
+    def __init__(self, path: str = WS_PUBSUB_SOCKET):
+        if fcntl is None:
+            raise RuntimeError("The unix pub/sub backend needs fcntl (POSIX only).")
+        self.path = path
+        self.handlers: dict = {}  # {channel: handler(message)}
+        self.writer = None
+        self.broker = None
+        self.lock_file = None
+        self.task = None
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+        if self.writer:
+            self.writer.close()
+        if self.broker:
+            await self.broker.stop()
+        if self.lock_file:
+            self.lock_file.close()
+
+    def subscribe(self, channel: str, handler):
+        self.handlers[channel] = handler
+        self._send(encode_frame(OP_SUBSCRIBE, channel))
+
+    def unsubscribe(self, channel: str):
+        if self.handlers.pop(channel, None) is not None:
+            self._send(encode_frame(OP_UNSUBSCRIBE, channel))
+
+    def publish(self, channel: str, message: dict):
+        self._send(encode_frame(OP_PUBLISH, channel, json.dumps(message).encode()))
+
+    def _send(self, frame: bytes):
+        # Best effort: room traffic is superseded every tick, so while the
+        # broker is unreachable frames are simply not sent.
+        if self.writer is not None:
+            self.writer.write(frame)
+
+    async def _become_broker_if_free(self):
+        if self.broker is not None:
+            return
+        if self.lock_file is None:
+            self.lock_file = open(self.path + ".lock", "a+")
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return
+        self.broker = UnixSocketBroker(self.path)
+        await self.broker.start()
+        print(f"INFO: Worker {os.getpid()} is hosting the pub/sub broker at {self.path}")
+
+    async def _run(self):
+        while True:
+            try:
+                await self._become_broker_if_free()
+                reader, writer = await asyncio.open_unix_connection(self.path)
+                self.writer = writer
+                for channel in self.handlers:
+                    self._send(encode_frame(OP_SUBSCRIBE, channel))
+                if self.on_connect:
+                    self.on_connect()
+                while True:
+                    op, channel, payload, _ = await read_frame(reader)
+                    handler = self.handlers.get(channel)
+                    if op == OP_PUBLISH and handler is not None:
+                        try:
+                            handler(json.loads(payload))
+                        except Exception as e:
+                            print(f"Pub/sub handler error on {channel}: {e}")
+            except (OSError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                if self.writer is not None:
+                    self.writer.close()
+                self.writer = None
+            await asyncio.sleep(RECONNECT_DELAY)
+
+
+def create_pubsub(backend: str = WS_PUBSUB_BACKEND) -> PubSub:
+    if backend == "unix":
+        return UnixSocketPubSub()
+    if backend == "local":
+        return LocalPubSub()
+    raise ValueError(f"Unknown WS_PUBSUB_BACKEND: {backend}")
@@ -0,0 +1,854 @@
+import asyncio
+import json
+import math
+import os
+import struct
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from fastapi import WebSocket
+from jose import JWTError, jwt
+from pydantic import ValidationError
+
+from app import wire
+from app.pubsub import create_pubsub
+from app.routers.auth import ALGORITHM, SECRET_KEY
+from app.schemas import COORDINATE_LIMIT, AvatarFrame
+from app.spatial import SpatialGrid
+
+# --- OUTBOUND QUEUE SETTINGS ---
+# Every connection gets its own bounded send queue drained by a dedicated writer
+# task, so one slow or stalled client can never hold up the rest of its room.
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+
+# What to do when a client's queue is full:
+#   "drop_oldest" - discard the oldest queued position frame to make room
+#   "disconnect"  - close the connection (the client can reconnect)
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DISCONNECT = "disconnect"
+WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", OVERFLOW_DROP_OLDEST)
+
+# Close code sent to clients that are disconnected for falling behind
+# (1013 = "Try Again Later").
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+# --- ROOM TICK SETTINGS ---
+# Avatar frames are folded into per-room state and sent out as one combined
+# delta snapshot per tick instead of being re-broadcast as they arrive.
+WS_TICK_RATE = float(os.getenv("WS_TICK_RATE", "20"))  # snapshots per second
+
+# Fields of an avatar frame that make up a player's state. Motion fields are
+# subject to interest management below; profile fields always go to everyone.
+PROFILE_FIELDS = ("username", "likes", "avatarType", "color")
+MOTION_FIELDS = ("position", "rotation")
+PLAYER_FIELDS = PROFILE_FIELDS + MOTION_FIELDS
+
+# --- INTEREST MANAGEMENT ---
+# Player positions are indexed on a uniform grid of WS_INTEREST_CELL_SIZE metres.
+# Motion within WS_INTEREST_RADIUS cells of a client is sent every tick; motion
+# of players further away is only sent every WS_FAR_UPDATE_DIVISOR ticks.
+WS_INTEREST_CELL_SIZE = float(os.getenv("WS_INTEREST_CELL_SIZE", "16"))
+WS_INTEREST_RADIUS = int(os.getenv("WS_INTEREST_RADIUS", "1"))
+WS_FAR_UPDATE_DIVISOR = max(1, int(os.getenv("WS_FAR_UPDATE_DIVISOR", "5")))
+
+# --- ROOM STATE RETENTION ---
+# A player whose socket drops is kept in the room for WS_RESUME_GRACE seconds;
+# reconnecting with the resume token from the "welcome" message picks the
+# avatar back up without it being announced as a new player. State relayed
+# from other workers expires if not refreshed within WS_STATE_TTL seconds.
+WS_RESUME_GRACE = float(os.getenv("WS_RESUME_GRACE", "15"))
+WS_STATE_TTL = float(os.getenv("WS_STATE_TTL", "60"))
+RESUME_TOKEN_EXPIRE = timedelta(hours=1)
+
+# --- INGRESS LIMITS ---
+# Frames are checked before they are parsed, so a misbehaving client costs the
+# worker a size check and a token-bucket lookup, not a JSON decode.
+# The client sends 20 frames a second; the bucket leaves room for hello/pong
+# and for frames that bunch up after a stall.
+WS_MAX_FRAME_BYTES = int(os.getenv("WS_MAX_FRAME_BYTES", "4096"))
+WS_MAX_MESSAGES_PER_SEC = float(os.getenv("WS_MAX_MESSAGES_PER_SEC", "30"))
+WS_MESSAGE_BURST = float(os.getenv("WS_MESSAGE_BURST", "60"))
+# Rate-limited and invalid frames count as violations; each accepted frame
+# forgives one. A client that piles up more than this is disconnected.
+WS_MAX_VIOLATIONS = int(os.getenv("WS_MAX_VIOLATIONS", "100"))
+# A client that has sent nothing for WS_PING_INTERVAL seconds is pinged, and
+# disconnected if it is still silent after WS_IDLE_TIMEOUT seconds. Its
+# avatar is then held for WS_RESUME_GRACE like any other dropped socket.
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "10"))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "30"))
+
+# 1009 = "Message Too Big", 1008 = "Policy Violation", 1001 = "Going Away".
+FRAME_TOO_BIG_CLOSE_CODE = 1009
+ABUSIVE_CLIENT_CLOSE_CODE = 1008
+IDLE_CLIENT_CLOSE_CODE = 1001
+
+# --- CHANNELS ---
+# A client keeps one socket and subscribes to channels in-band:
+#   room:<room_id>      avatars in a room (public_<era>, user_<username>, ...)
+#   museum:<username>   the avatars in someone's personal museum
+#   notifications       the signed-in user's own notifications
+# A socket is in at most one room at a time; subscribing to another room
+# leaves the current one.
+WS_MAX_CHANNELS = int(os.getenv("WS_MAX_CHANNELS", "8"))
+
+
+def user_channel(username: str) -> str:
+    return f"user:{username}"
+
+
+def resolve_channel(name: str, username: str = None):
+    """
+    Map a channel name from a client to ("room", room_id) or ("user", pub/sub
+    channel). Returns None for unknown channels and ones the client may not see.
+    """
+    kind, _, arg = name.partition(":")
+    if kind == "room" and arg:
+        return ("room", arg)
+    if kind == "museum" and arg:
+        return ("room", f"user_{arg}")
+    if name == "notifications" and username:
+        return ("user", user_channel(username))
+    return None
+
+
+def create_resume_token(user_id: str, room_id: str) -> str:
+    # No "sub" claim, so the token can never pass as a login cookie.
+    expire = datetime.utcnow() + RESUME_TOKEN_EXPIRE
+    return jwt.encode({"resume": user_id, "room": room_id, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def read_resume_token(token: str, room_id: str):
+    """The userId a resume token was issued for, or None if it isn't valid here."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("room") != room_id:
+        return None
+    return payload.get("resume")
+
+
+class TokenBucket:
+    """Allows `rate` events per second on average, and bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class Client:
+    """A connected socket plus its outbound queue and writer task."""
+
+    def __init__(self, websocket: WebSocket, stats: dict,
+                 protocol: str = None,
+                 queue_size: int = WS_SEND_QUEUE_SIZE,
+                 overflow_policy: str = WS_OVERFLOW_POLICY):
+        self.websocket = websocket
+        # Signed-in user behind the socket, if any.
+        self.username = None
+        # The room this socket is in, and the channel name it was joined by.
+        self.room_id = None
+        self.room_channel = None
+        # Other channels: {name the client used: pub/sub channel}
+        self.channels: dict = {}
+        self.binary = protocol == wire.SUBPROTOCOL_BINARY
+        self.stats = stats
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        # Entries are (payload, droppable); only droppable (position) frames
+        # may be discarded by the drop_oldest policy.
+        self.queue = deque()
+        self.wakeup = asyncio.Event()
+        self.closed = False
+        self.writer_task = None
+        self.close_task = None
+        # The avatar this socket is driving, learned from its first frame.
+        self.user_id = None
+        # Inbound limits.
+        self.bucket = TokenBucket(WS_MAX_MESSAGES_PER_SEC, WS_MESSAGE_BURST)
+        self.violations = 0
+
+    def start(self):
+        self.writer_task = asyncio.create_task(self._writer())
+
+    def send(self, payload, droppable: bool = True) -> bool:
+        """Queue an already-encoded payload. Never blocks."""
+        if self.closed:
+            return False
+
+        if len(self.queue) >= self.queue_size:
+            if self.overflow_policy == OVERFLOW_DROP_OLDEST and self._drop_oldest():
+                self.stats["frames_dropped"] += 1
+            else:
+                self.stats["slow_disconnects"] += 1
+                self.close(SLOW_CLIENT_CLOSE_CODE)
+                return False
+
+        self.queue.append((payload, droppable))
+        self.wakeup.set()
+        return True
+
+    def _drop_oldest(self) -> bool:
+        for i, (_, droppable) in enumerate(self.queue):
+            if droppable:
+                del self.queue[i]
+                return True
+        return False
+
+    def close(self, code: int = None):
+        """Stop the writer; if a code is given the socket is closed with it."""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        if self.writer_task:
+            self.writer_task.cancel()
+        if code is not None:
+            self.close_task = asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _writer(self):
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                    continue
+                payload, _ = self.queue.popleft()
+                if isinstance(payload, bytes):
+                    await self.websocket.send_bytes(payload)
+                else:
+                    await self.websocket.send_text(payload)
+        except Exception:
+            # The socket went away underneath us; the receive loop will clean up.
+            self.closed = True
+
+
+class Room:
+    """Latest state of every player in a room plus the tick loop that sends it."""
+
+    def __init__(self, room_id: str, publish=None, tick_rate: float = WS_TICK_RATE,
+                 cell_size: float = WS_INTEREST_CELL_SIZE,
+                 interest_radius: int = WS_INTEREST_RADIUS,
+                 far_divisor: int = WS_FAR_UPDATE_DIVISOR):
+        self.room_id = room_id
+        # publish(message) forwards this worker's changes to the other workers.
+        self.publish = publish
+        self.tick_interval = 1.0 / tick_rate
+        # Expiry and keep-alives run about once a second.
+        self.maintenance_ticks = max(1, int(tick_rate * min(WS_STATE_TTL / 3, 1.0)))
+        self.interest_radius = interest_radius
+        self.far_divisor = far_divisor
+        self.clients: dict = {}   # {WebSocket: Client}
+        self.players: dict = {}   # {userId: {field: value}}
+        self.dirty: dict = {}     # {userId: {field: value}} changed since the last tick
+        self.far_dirty: set = set()  # userIds with motion some clients haven't seen yet
+        self.left: set = set()    # userIds that left since the last tick
+        self.joined: set = set()  # userIds that appeared since the last tick
+        # Changes made by this worker's own clients, published once per tick.
+        self.outbox: dict = {}    # {userId: {field: value}}
+        self.outbox_left: set = set()
+        # Retention: when each player was last heard of, and the deadline for
+        # local players whose socket dropped to come back.
+        self.last_seen: dict = {}  # {userId: monotonic time}
+        self.away: dict = {}       # {userId: monotonic deadline}
+        # Called once the room has neither clients nor players waiting to resume.
+        self.on_empty = None
+        self.grid = SpatialGrid(cell_size)
+        # Small integer ids standing in for userIds on the binary protocol.
+        self.pids: dict = {}      # {userId: player id}
+        self.next_pid = 1
+        self.tick = 0
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    def update_player(self, user_id: str, frame: dict, local: bool = True):
+        """Merge a frame into the player's state, keeping only changed fields."""
+        if user_id not in self.players:
+            self.joined.add(user_id)
+            self._assign_pid(user_id)
+        self.last_seen[user_id] = time.monotonic()
+        state = self.players.setdefault(user_id, {})
+        for field in PLAYER_FIELDS:
+            if field in frame and state.get(field) != frame[field]:
+                state[field] = frame[field]
+                self.dirty.setdefault(user_id, {})[field] = frame[field]
+                if local:
+                    self.outbox.setdefault(user_id, {})[field] = frame[field]
+        position = frame.get("position")
+        if isinstance(position, dict):
+            try:
+                self.grid.move(user_id, float(position["x"]), float(position["z"]))
+            except (KeyError, TypeError, ValueError):
+                pass
+        self.left.discard(user_id)
+
+    def remove_player(self, user_id: str, local: bool = True):
+        if local:
+            self.outbox.pop(user_id, None)
+            self.outbox_left.add(user_id)
+        self.players.pop(user_id, None)
+        self.last_seen.pop(user_id, None)
+        self.away.pop(user_id, None)
+        self.dirty.pop(user_id, None)
+        self.far_dirty.discard(user_id)
+        self.joined.discard(user_id)
+        self.grid.remove(user_id)
+        self.left.add(user_id)
+
+    def local_user_ids(self) -> set:
+        return {c.user_id for c in self.clients.values() if c.user_id}
+
+    def flush_outbox(self):
+        if not self.publish or (not self.outbox and not self.outbox_left):
+            return
+        self.publish({"op": "state", "players": self.outbox, "left": list(self.outbox_left)})
+        self.outbox = {}
+        self.outbox_left = set()
+
+    def hosted_user_ids(self) -> set:
+        """Players this worker is responsible for: connected or waiting to resume."""
+        return self.local_user_ids() | set(self.away)
+
+    def publish_local_state(self):
+        """Send the full state of this worker's players, for workers that just joined."""
+        if not self.publish:
+            return
+        players = {uid: self.players[uid] for uid in self.hosted_user_ids() if uid in self.players}
+        if players:
+            self.publish({"op": "state", "players": players, "left": []})
+
+    def apply_remote(self, message: dict):
+        """Apply a message published by another worker for this room."""
+        op = message.get("op")
+        if op == "state":
+            for user_id, fields in message.get("players", {}).items():
+                # The player resumed on another worker; it is theirs now.
+                self.away.pop(user_id, None)
+                self.update_player(user_id, fields, local=False)
+            for user_id in message.get("left", []):
+                self.remove_player(user_id, local=False)
+        elif op == "alive":
+            now = time.monotonic()
+            for user_id in message.get("players", []):
+                if user_id in self.players:
+                    self.last_seen[user_id] = now
+        elif op == "sync":
+            self.publish_local_state()
+
+    def hold_for_resume(self, user_id: str, grace: float = WS_RESUME_GRACE):
+        if grace > 0:
+            self.away[user_id] = time.monotonic() + grace
+        else:
+            self.remove_player(user_id)
+
+    def expire_stale(self):
+        """Drop players whose resume window passed or whose worker went quiet."""
+        now = time.monotonic()
+        for user_id, deadline in list(self.away.items()):
+            if now > deadline:
+                self.remove_player(user_id)
+        hosted = self.hosted_user_ids()
+        for user_id in list(self.players):
+            if user_id not in hosted and now - self.last_seen.get(user_id, now) > WS_STATE_TTL:
+                self.remove_player(user_id, local=False)
+        if self.publish and hosted:
+            # Remote idle players send no deltas; this keeps them from expiring.
+            self.publish({"op": "alive", "players": list(hosted)})
+        if not self.clients and not self.away and self.on_empty:
+            self.on_empty()
+
+    def full_snapshot(self) -> dict:
+        return {
+            "type": "snapshot",
+            "tick": self.tick,
+            "full": True,
+            "players": [{"userId": uid, **state} for uid, state in self.players.items()],
+        }
+
+    def _assign_pid(self, user_id: str):
+        if user_id in self.pids:
+            return
+        if self.next_pid <= wire.MAX_PLAYER_ID:
+            pid = self.next_pid
+            self.next_pid += 1
+        else:
+            # Ids are only reused once the 16-bit space is exhausted, so a client
+            # never confuses a departed player with a newcomer.
+            in_use = set(self.pids.values())
+            pid = next((p for p in range(1, wire.MAX_PLAYER_ID + 1) if p not in in_use), None)
+            if pid is None:
+                return
+        self.pids[user_id] = pid
+
+    def delta_snapshots(self) -> list:
+        """
+        Build this tick's snapshots as [(clients, message)]. Clients standing in
+        the same grid cell share a neighbourhood, so they share one message.
+        """
+        far_tick = self.tick % self.far_divisor == 0
+        if not self.dirty and not self.left and not (far_tick and self.far_dirty):
+            return []
+
+        profile = {}
+        motion = {}
+        for uid, delta in self.dirty.items():
+            for field, value in delta.items():
+                target = motion if field in MOTION_FIELDS else profile
+                target.setdefault(uid, {})[field] = value
+
+        # On far ticks everyone gets all motion, plus the latest state of players
+        # whose earlier motion was held back from some clients.
+        catch_up = {}
+        if far_tick:
+            for uid in self.far_dirty:
+                state = self.players.get(uid, {})
+                catch_up[uid] = {f: state[f] for f in MOTION_FIELDS if f in state}
+            self.far_dirty = set()
+
+        groups = {}
+        for client in self.clients.values():
+            cell = self.grid.cell_of(client.user_id) if client.user_id else None
+            groups.setdefault(cell, []).append(client)
+
+        snapshots = []
+        for cell, clients in groups.items():
+            # Clients without a known position see the whole room.
+            near = None
+            if cell is not None and not far_tick:
+                near = self.grid.nearby(cell, self.interest_radius)
+            players = {uid: dict(fields) for uid, fields in profile.items()}
+            for uid, fields in catch_up.items():
+                players.setdefault(uid, {}).update(fields)
+            for uid, fields in motion.items():
+                # Newcomers are placed for everyone straight away.
+                if near is None or uid in near or uid in self.joined:
+                    players.setdefault(uid, {}).update(fields)
+                else:
+                    self.far_dirty.add(uid)
+            if not players and not self.left:
+                continue
+            message = {
+                "type": "snapshot",
+                "tick": self.tick,
+                "players": [{"userId": uid, **fields} for uid, fields in players.items()],
+            }
+            if self.left:
+                message["left"] = list(self.left)
+            snapshots.append((clients, message))
+
+        self.dirty = {}
+        self.left = set()
+        self.joined = set()
+        return snapshots
+
+    def send_snapshot(self, clients, message: dict, essential: bool = False):
+        """Queue a snapshot for `clients`, leaving out each client's own avatar.
+
+        A client already knows where it is, so echoing its own state back every
+        tick would only cost bandwidth. Clients not listed in the snapshot share
+        one encoding; one that is listed gets a copy without its own entry.
+        """
+        listed = {p.get("userId") for p in message.get("players", [])}
+        views = {}
+        for client in clients:
+            views.setdefault(client.user_id if client.user_id in listed else None, []).append(client)
+        for own, recipients in views.items():
+            view = message
+            if own is not None:
+                view = {**message, "players": [p for p in message["players"] if p.get("userId") != own]}
+                if not view["players"] and not view.get("left") and not view.get("full"):
+                    continue
+            self._send_view(recipients, view, essential)
+
+    def _send_view(self, clients, message: dict, essential: bool):
+        """Encode a snapshot at most once per wire format and queue it for `clients`."""
+        players = message.get("players", [])
+        has_profile = any(field in p for p in players for field in PROFILE_FIELDS)
+        json_payload = None
+        binary_payloads = None
+
+        for client in clients:
+            if client.binary:
+                if binary_payloads is None:
+                    binary_payloads = []
+                    profile = wire.profile_message(message, self.pids, PROFILE_FIELDS)
+                    if profile:
+                        binary_payloads.append((json.dumps(profile), False))
+                    if message.get("left") or any(f in p for p in players for f in MOTION_FIELDS):
+                        snapshot = wire.encode_snapshot(message, self.pids)
+                        binary_payloads.append((snapshot, not essential and not message.get("left")))
+                for payload, droppable in binary_payloads:
+                    client.send(payload, droppable=droppable)
+            else:
+                if json_payload is None:
+                    json_payload = json.dumps(message)
+                # Only pure motion updates may be dropped; profiles and departures
+                # would never be repeated.
+                droppable = not essential and not has_profile and not message.get("left")
+                client.send(json_payload, droppable=droppable)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            next_tick += self.tick_interval
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            self.tick += 1
+            if self.tick % self.maintenance_ticks == 0:
+                self.expire_stale()
+            self.flush_outbox()
+            departed = self.left
+            # Encoded once per neighbourhood, not once per recipient.
+            for clients, message in self.delta_snapshots():
+                self.send_snapshot(clients, message)
+            for user_id in departed:
+                if user_id not in self.players:
+                    self.pids.pop(user_id, None)
+
+
+# --- WEBSOCKET MANAGER ---
+class ConnectionManager:
+    def __init__(self):
+        # Active rooms: {room_id: Room}
+        self.rooms: dict = {}
+        # Subscribers to non-room channels: {channel: {Client: name the client used}}
+        self.channels: dict = {}
+        self.stats = {
+            # Outbound
+            "frames_dropped": 0,
+            "slow_disconnects": 0,
+            # Inbound
+            "frames_received": 0,
+            "frames_rate_limited": 0,
+            "frames_invalid": 0,
+            "oversized_disconnects": 0,
+            "abuse_disconnects": 0,
+            "idle_disconnects": 0,
+        }
+        # Fans room changes out to the other worker processes.
+        self.pubsub = create_pubsub()
+        self.pubsub.on_connect = self._resync_rooms
+        self.loop = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        await self.pubsub.start()
+
+    async def stop(self):
+        await self.pubsub.stop()
+
+    @staticmethod
+    def room_channel(room_id: str) -> str:
+        return f"room:{room_id}"
+
+    def _open_room(self, room_id: str) -> Room:
+        channel = self.room_channel(room_id)
+        room = Room(room_id, publish=lambda message: self.pubsub.publish(channel, message))
+        room.on_empty = lambda: self._close_room(room_id)
+        self.rooms[room_id] = room
+        room.start()
+        self.pubsub.subscribe(channel, room.apply_remote)
+        # Ask the other workers for the players they already host in this room.
+        self.pubsub.publish(channel, {"op": "sync"})
+        return room
+
+    def _close_room(self, room_id: str):
+        room = self.rooms.pop(room_id)
+        room.flush_outbox()
+        room.stop()
+        self.pubsub.unsubscribe(self.room_channel(room_id))
+
+    def _resync_rooms(self):
+        for room_id, room in self.rooms.items():
+            room.publish_local_state()
+            self.pubsub.publish(self.room_channel(room_id), {"op": "sync"})
+
+    async def connect(self, websocket: WebSocket, room_id: str = None,
+                      resume_token: str = None, username: str = None) -> Client:
+        protocol = wire.negotiate(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=protocol)
+        client = Client(websocket, self.stats, protocol=protocol)
+        client.username = username
+        client.start()
+        if room_id:
+            self.join_room(client, room_id, f"room:{room_id}", resume_token)
+        return client
+
+    def join_room(self, client: Client, room_id: str, channel: str, resume_token: str = None):
+        if client.room_id == room_id:
+            client.room_channel = channel
+            self._reply(client, "subscribed", channel)
+            return
+        if client.room_id:
+            self.leave_room(client)
+        room = self.rooms.get(room_id) or self._open_room(room_id)
+        room.clients[client.websocket] = client
+        client.room_id = room_id
+        client.room_channel = channel
+        # Everything the client receives after this belongs to the new room.
+        self._reply(client, "subscribed", channel)
+
+        # Picking an avatar back up: it never left as far as everyone else knows.
+        user_id = read_resume_token(resume_token, room_id) if resume_token else None
+        if (user_id and user_id in room.players and user_id not in room.local_user_ids()
+                and client.user_id in (None, user_id)):
+            room.away.pop(user_id, None)
+            client.user_id = user_id
+            self._welcome(client, resumed=True)
+        elif client.user_id:
+            # Switching rooms: the avatar comes along unless the name is taken here.
+            if client.user_id in room.players:
+                client.user_id = None
+            else:
+                self._welcome(client, resumed=False)
+
+        # Newcomers get everyone's current state up front, since idle players
+        # produce no deltas.
+        room.send_snapshot([client], room.full_snapshot(), essential=True)
+
+    def leave_room(self, client: Client, hold: bool = False):
+        """Take the client out of its room; `hold` keeps its avatar around for a resume."""
+        room = self.rooms.get(client.room_id)
+        client.room_id = None
+        client.room_channel = None
+        if room is None:
+            return
+        room.clients.pop(client.websocket, None)
+        if client.user_id and client.user_id not in room.local_user_ids():
+            if hold:
+                room.hold_for_resume(client.user_id)
+            else:
+                room.remove_player(client.user_id)
+        if not room.clients and not room.away:
+            self._close_room(room.room_id)
+
+    def _welcome(self, client: Client, resumed: bool):
+        client.send(json.dumps({
+            "type": "welcome",
+            "userId": client.user_id,
+            "resumed": resumed,
+            "resumeToken": create_resume_token(client.user_id, client.room_id),
+        }), droppable=False)
+
+    def _reply(self, client: Client, reply: str, channel: str, detail: str = None):
+        message = {"type": reply, "channel": channel}
+        if detail:
+            message["detail"] = detail
+        client.send(json.dumps(message), droppable=False)
+
+    def disconnect(self, client: Client):
+        client.close()
+        self.leave_room(client, hold=True)
+        for channel in list(client.channels.values()):
+            self._unsubscribe(client, channel)
+        client.channels = {}
+
+    def subscribe(self, client: Client, name: str, resume_token: str = None):
+        target = resolve_channel(name, client.username)
+        if target is None:
+            self._reply(client, "error", name, "Unknown channel")
+            return
+        kind, key = target
+        if kind == "room":
+            self.join_room(client, key, name, resume_token)
+            return
+        if name not in client.channels:
+            if len(client.channels) >= WS_MAX_CHANNELS:
+                self._reply(client, "error", name, "Too many channels")
+                return
+            client.channels[name] = key
+            subscribers = self.channels.get(key)
+            if subscribers is None:
+                subscribers = self.channels[key] = {}
+                self.pubsub.subscribe(key, lambda message: self._deliver(key, message))
+            subscribers[client] = name
+        self._reply(client, "subscribed", name)
+
+    def unsubscribe(self, client: Client, name: str):
+        if name == client.room_channel:
+            self.leave_room(client)
+        elif name in client.channels:
+            self._unsubscribe(client, client.channels.pop(name))
+        else:
+            return
+        self._reply(client, "unsubscribed", name)
+
+    def _unsubscribe(self, client: Client, channel: str):
+        subscribers = self.channels.get(channel)
+        if subscribers is None:
+            return
+        subscribers.pop(client, None)
+        if not subscribers:
+            del self.channels[channel]
+            self.pubsub.unsubscribe(channel)
+
+    def publish(self, channel: str, message: dict):
+        """Send a message to every subscriber of a channel, on all workers."""
+        self._deliver(channel, message)
+        self.pubsub.publish(channel, message)
+
+    def publish_threadsafe(self, channel: str, message: dict):
+        """publish() for callers that may run outside the event loop, e.g. sync route handlers."""
+        if self.loop is None or self.loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.publish(channel, message)
+        else:
+            self.loop.call_soon_threadsafe(self.publish, channel, message)
+
+    def _deliver(self, channel: str, message: dict):
+        subscribers = self.channels.get(channel)
+        if not subscribers:
+            return
+        # Encoded once per channel name the subscribers used.
+        payloads = {}
+        for client, name in list(subscribers.items()):
+            if name not in payloads:
+                payloads[name] = json.dumps({"channel": name, **message})
+            client.send(payloads[name], droppable=False)
+
+    async def serve(self, client: Client):
+        """Read frames from the client until it disconnects or is disconnected."""
+        try:
+            await self._read_frames(client)
+        finally:
+            # Let a close we started reach the socket before the endpoint returns.
+            if client.close_task:
+                await client.close_task
+
+    async def _read_frames(self, client: Client):
+        websocket = client.websocket
+        pinged = False
+        while not client.closed:
+            timeout = WS_IDLE_TIMEOUT - WS_PING_INTERVAL if pinged else WS_PING_INTERVAL
+            try:
+                message = await asyncio.wait_for(websocket.receive(), max(timeout, 0.1))
+            except asyncio.TimeoutError:
+                if not pinged:
+                    client.send(json.dumps({"type": "ping"}), droppable=False)
+                    pinged = True
+                    continue
+                self.stats["idle_disconnects"] += 1
+                client.close(IDLE_CLIENT_CLOSE_CODE)
+                return
+            pinged = False
+            if message["type"] == "websocket.disconnect":
+                return
+            data = message.get("bytes")
+            if data is None:
+                data = message.get("text")
+            if data is None:
+                continue
+            # The limit is on bytes; a text frame arrives already decoded, and a
+            # character can take up to four bytes on the wire.
+            if not self._admit(client, len(data) if isinstance(data, bytes) else len(data.encode())):
+                continue
+            if isinstance(data, bytes):
+                self.receive_binary(client, data)
+            else:
+                self.receive_text(client, data)
+
+    def _admit(self, client: Client, size: int) -> bool:
+        """Size and rate checks, done before a frame is decoded."""
+        if size > WS_MAX_FRAME_BYTES:
+            self.stats["oversized_disconnects"] += 1
+            client.close(FRAME_TOO_BIG_CLOSE_CODE)
+            return False
+        if not client.bucket.take():
+            self.stats["frames_rate_limited"] += 1
+            self._violation(client)
+            return False
+        self.stats["frames_received"] += 1
+        if client.violations:
+            client.violations -= 1
+        return True
+
+    def _violation(self, client: Client):
+        client.violations += 1
+        if client.violations > WS_MAX_VIOLATIONS:
+            self.stats["abuse_disconnects"] += 1
+            client.close(ABUSIVE_CLIENT_CLOSE_CODE)
+
+    def _reject(self, client: Client):
+        self.stats["frames_invalid"] += 1
+        self._violation(client)
+
+    def receive_text(self, client: Client, text: str):
+        try:
+            frame = AvatarFrame.model_validate_json(text)
+        except ValidationError:
+            self._reject(client)
+            return
+        if frame.type == "pong":
+            return
+        if frame.type == "subscribe" and frame.channel:
+            self.subscribe(client, frame.channel, frame.resume)
+            return
+        if frame.type == "unsubscribe" and frame.channel:
+            self.unsubscribe(client, frame.channel)
+            return
+        self.receive(client, frame.model_dump(exclude_none=True, exclude={"channel", "resume"}))
+
+    def receive(self, client: Client, frame: dict):
+        """Fold an incoming avatar frame into its room's state for the next tick."""
+        room = self.rooms.get(client.room_id)
+        user_id = frame.get("userId") if isinstance(frame, dict) else None
+        if room is None or not user_id:
+            return
+        # A socket drives exactly one avatar.
+        if client.user_id and client.user_id != user_id:
+            return
+        if not client.user_id:
+            # Existing avatars can only be taken over with their resume token.
+            if user_id in room.players:
+                return
+            client.user_id = user_id
+            self._welcome(client, resumed=False)
+        room.update_player(user_id, frame)
+
+    def receive_binary(self, client: Client, data: bytes):
+        """Apply a binary motion frame; the player is whoever this socket said hello as."""
+        room = self.rooms.get(client.room_id)
+        if room is None or not client.user_id:
+            return
+        try:
+            frame = wire.decode_motion_frame(data)
+        except struct.error:
+            self._reject(client)
+            return
+        values = (*frame["position"].values(), *frame["rotation"].values())
+        if not all(math.isfinite(v) and abs(v) <= COORDINATE_LIMIT for v in values):
+            self._reject(client)
+            return
+        room.update_player(client.user_id, frame)
+
+
+manager = ConnectionManager()
@@ -33,7 +33,7 @@ def generate_tour(era: str = None, db: Session = Depends(database.get_db)):
         query = query.filter(models.Artifact.era == era)
         
     # Get the list that matches what the frontend sees (for index calculation)
-    all_artifacts_in_view = query.order_by(models.Artifact.likes_count.desc(), models.Artifact.id.asc()).all()
+    all_artifacts_in_view = query.order_by(models.gallery_likes.desc(), models.Artifact.id.asc()).all()
     
     # Select all artifacts for the tour
     tour_artifacts = all_artifacts_in_view
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request
 from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
+from sqlalchemy import case, delete, func, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from typing import Optional, List
 import shutil
 import os
@@ -11,7 +13,10 @@ from fastapi.templating import Jinja2Templates
 import openai
 
 from .. import models, schemas, database
-from .auth import get_current_user
+from ..notifications import notify
+from ..tags import tag_artifact, untag_artifact
+from .. import facets, liked_cache
+from .auth import get_current_user, get_current_user_async
 
 router = APIRouter(
     prefix="/artifacts",
@@ -22,7 +27,7 @@ UPLOAD_DIR = "app/media"
 templates = Jinja2Templates(directory="app/templates")
 
 @router.post("/create")
-async def create_artifact(
+def create_artifact(
     title: str = Form(...),
     short_description: str = Form(...),
     long_description: str = Form(None),
@@ -67,13 +72,16 @@ async def create_artifact(
     )
     
     db.add(new_artifact)
+    db.flush()
+    tag_artifact(db, new_artifact)
+    facets.record(db, new_artifact, +1)
     db.commit()
     db.refresh(new_artifact)
     
     return RedirectResponse(url=f"/artifact/{new_artifact.id}", status_code=303)
 
 @router.post("/{artifact_id}/delete")
-async def delete_artifact(
+def delete_artifact(
     artifact_id: int,
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(get_current_user)
@@ -89,6 +97,8 @@ async def delete_artifact(
     if artifact.creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this artifact")
         
+    untag_artifact(db, artifact)
+    facets.record(db, artifact, -1)
     db.delete(artifact)
     db.commit()
     
@@ -99,50 +109,64 @@ async def like_artifact(
     request: Request,
     artifact_id: int,
     redirect_to: str = Form(None),
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     if not current_user:
         if request.headers.get("accept") == "application/json":
             raise HTTPException(status_code=401, detail="Login required")
         return RedirectResponse(url="/login?error=Please login to like artifacts", status_code=303)
 
-    artifact = db.query(models.Artifact).filter(models.Artifact.id == artifact_id).first()
+    # The toggle is decided by the database, not by reading the Like first:
+    # deleting tells us whether it was liked, and the insert only adds a like
+    # if the artifact exists and there isn't one already. likes_count moves in
+    # the same transaction, in SQL, so concurrent taps can't lose an update.
+    unliked = await db.execute(
+        delete(models.Like)
+        .where(models.Like.user_id == current_user.id, models.Like.artifact_id == artifact_id)
+    )
+    likes = func.coalesce(models.Artifact.likes_count, 0)
+    is_liked = added = False
+    if unliked.rowcount:
+        change = case((likes > 0, likes - 1), else_=0)
+    else:
+        liked = await db.execute(
+            database.insert_for(db)(models.Like)
+            .from_select(["user_id", "artifact_id"],
+                         select(literal(current_user.id), models.Artifact.id).where(models.Artifact.id == artifact_id))
+            .on_conflict_do_nothing()
+        )
+        # Nothing inserted: no such artifact, or (on PostgreSQL) a concurrent
+        # tap liked it first. Either way the count stays as it is.
+        is_liked, added = True, bool(liked.rowcount)
+        change = likes + 1 if added else likes
+    artifact = (await db.execute(
+        update(models.Artifact).where(models.Artifact.id == artifact_id)
+        .values(likes_count=change)
+        .returning(models.Artifact.likes_count, models.Artifact.creator_id, models.Artifact.title)
+        .execution_options(synchronize_session=False)
+    )).first()
     if not artifact:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="Artifact not found")
-    
-    # Check if already liked
-    existing_like = db.query(models.Like).filter(
-        models.Like.user_id == current_user.id,
-        models.Like.artifact_id == artifact_id
-    ).first()
 
-    is_liked = False
-    if existing_like:
-        # Already liked -> Unlike
-        db.delete(existing_like)
-        if artifact.likes_count > 0:
-            artifact.likes_count -= 1
-    else:
-        # Not liked -> Like
-        new_like = models.Like(user_id=current_user.id, artifact_id=artifact_id)
-        db.add(new_like)
-        artifact.likes_count += 1
-        is_liked = True
-
-        # Create Notification
-        if artifact.creator_id != current_user.id:
-            notification = models.Notification(
-                recipient_id=artifact.creator_id,
-                sender_id=current_user.id,
-                artifact_id=artifact.id,
+    if unliked.rowcount or added:
+        liked_cache.record(db, current_user.id, artifact_id, added)
+
+    if added and artifact.creator_id != current_user.id:
+        creator = await db.get(models.User, artifact.creator_id)
+        if creator:
+            notify(
+                db,
+                recipient=creator,
+                sender=current_user,
+                artifact_id=artifact_id,
                 type="like",
                 message=f"{current_user.username} liked your artifact '{artifact.title}'"
             )
-            db.add(notification)
-    
-    db.commit()
-    
+
+    await db.commit()
+
     if request.headers.get("accept") == "application/json":
         return {"success": True, "likes_count": artifact.likes_count, "liked": is_liked}
 
@@ -157,15 +181,15 @@ async def create_comment(
     artifact_id: int,
     text: str = Form(...),
     redirect_to: str = Form(None),
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     if not current_user:
         if request.headers.get("accept") == "application/json":
             raise HTTPException(status_code=401, detail="Login required")
         return RedirectResponse(url="/login", status_code=303)
     
-    artifact = db.query(models.Artifact).filter(models.Artifact.id == artifact_id).first()
+    artifact = await db.get(models.Artifact, artifact_id, options=[selectinload(models.Artifact.creator)])
     if not artifact:
         raise HTTPException(status_code=404, detail="Artifact not found")
         
@@ -175,19 +199,24 @@ async def create_comment(
         text=text
     )
     db.add(new_comment)
+    await db.execute(
+        update(models.Artifact)
+        .where(models.Artifact.id == artifact_id)
+        .values(comments_count=func.coalesce(models.Artifact.comments_count, 0) + 1)
+    )
 
     # Create Notification
     if artifact.creator_id != current_user.id:
-        notification = models.Notification(
-            recipient_id=artifact.creator_id,
-            sender_id=current_user.id,
+        notify(
+            db,
+            recipient=artifact.creator,
+            sender=current_user,
             artifact_id=artifact.id,
             type="comment",
             message=f"{current_user.username} commented: {text[:30]}..."
         )
-        db.add(notification)
 
-    db.commit()
+    await db.commit()
     
     if request.headers.get("accept") == "application/json":
         return {
@@ -205,7 +234,7 @@ async def create_comment(
     return RedirectResponse(url=f"/artifact/{artifact_id}", status_code=303)
 
 @router.post("/{artifact_id}/collect")
-async def collect_artifact(
+def collect_artifact(
     artifact_id: int,
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(get_current_user)
@@ -239,6 +268,9 @@ async def collect_artifact(
     )
     
     db.add(new_copy)
+    db.flush()
+    tag_artifact(db, new_copy)
+    facets.record(db, new_copy, +1)
     db.commit()
     
     # Redirect to inventory or stay on page?
@@ -246,13 +278,13 @@ async def collect_artifact(
     return RedirectResponse(url="/my-artifacts", status_code=303)
 
 @router.get("/create-ai")
-async def create_ai_page(request: Request, current_user: models.User = Depends(get_current_user)):
+def create_ai_page(request: Request, current_user: models.User = Depends(get_current_user)):
     if not current_user:
         return RedirectResponse(url="/login", status_code=303)
     return templates.TemplateResponse("create_ai_artifact.html", {"request": request, "user": current_user})
 
 @router.post("/generate-ai")
-async def generate_ai_artifact(
+def generate_ai_artifact(
     prompt: str = Form(...),
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(get_current_user)
@@ -349,6 +381,9 @@ async def generate_ai_artifact(
     )
     
     db.add(new_artifact)
+    db.flush()
+    tag_artifact(db, new_artifact)
+    facets.record(db, new_artifact, +1)
     db.commit()
     db.refresh(new_artifact)
     
@@ -391,14 +426,14 @@ def request_collection(
     db.add(new_collection)
     
     # Create Notification for Owner
-    notification = models.Notification(
-        recipient_id=artifact.creator_id,
-        sender_id=current_user.id,
+    notify(
+        db,
+        recipient=artifact.creator,
+        sender=current_user,
         artifact_id=id,
         type="collection_request",
         message=f"{current_user.username} wants to add '{artifact.title}' to their collection."
     )
-    db.add(notification)
     db.commit()
 
     return {"message": "Collection request sent to the owner."}
@@ -430,14 +465,14 @@ def approve_collection(
         collection_entry.is_approved = True
         
         # Notify the requester
-        approval_notif = models.Notification(
-            recipient_id=requester_id,
-            sender_id=current_user.id,
+        notify(
+            db,
+            recipient=notification.sender,
+            sender=current_user,
             artifact_id=artifact_id,
             type="collection_approved",
             message=f"{current_user.username} approved your request to collect '{notification.artifact.title}'."
         )
-        db.add(approval_notif)
 
     # Mark notification as read or delete it? Let's mark as read and maybe update type to indicate handled
     notification.is_read = True
@@ -472,14 +507,14 @@ def decline_collection(
         db.delete(collection_entry)
 
     # Notify the requester
-    decline_notif = models.Notification(
-        recipient_id=requester_id,
-        sender_id=current_user.id,
+    notify(
+        db,
+        recipient=notification.sender,
+        sender=current_user,
         artifact_id=artifact_id,
         type="collection_declined",
         message=f"{current_user.username} declined your request to collect '{notification.artifact.title}'."
     )
-    db.add(decline_notif)
 
     notification.is_read = True
     notification.type = "request_handled"
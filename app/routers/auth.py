@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Request, Form
 from fastapi.responses import RedirectResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordRequestForm
 from passlib.context import CryptContext
@@ -47,8 +49,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(request: Request, db: Session = Depends(database.get_db)):
-    token = request.cookies.get("access_token")
+def read_access_token(token: Optional[str]) -> Optional[str]:
+    """Returns the username an access token was issued to, or None."""
     if not token:
         return None
     try:
@@ -57,17 +59,28 @@ def get_current_user(request: Request, db: Session = Depends(database.get_db)):
             token = token.split(" ")[1]
         
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
     except JWTError:
         return None
+    return payload.get("sub")
+
+def get_current_user(request: Request, db: Session = Depends(database.get_db)):
+    username = read_access_token(request.cookies.get("access_token"))
+    if username is None:
+        return None
     
     user = db.query(models.User).filter(models.User.username == username).first()
     return user
 
+async def get_current_user_async(request: Request, db: AsyncSession = Depends(database.get_async_db)):
+    username = read_access_token(request.cookies.get("access_token"))
+    if username is None:
+        return None
+
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    return result.scalars().first()
+
 @router.post("/signup")
-async def signup(
+def signup(
     username: str = Form(...),
     email: str = Form(...),
     password: str = Form(...),
@@ -98,7 +111,7 @@ async def signup(
     return response
 
 @router.post("/login")
-async def login(
+def login(
     username: str = Form(...),
     password: str = Form(...),
     db: Session = Depends(database.get_db)
@@ -123,13 +136,13 @@ async def logout():
     return response
 
 @router.get("/profile/edit")
-async def edit_profile_page(request: Request, current_user: models.User = Depends(get_current_user)):
+def edit_profile_page(request: Request, current_user: models.User = Depends(get_current_user)):
     if not current_user:
         return RedirectResponse(url="/login", status_code=303)
     return templates.TemplateResponse("edit_profile.html", {"request": request, "user": current_user})
 
 @router.post("/profile/edit")
-async def update_profile(
+def update_profile(
     username: str = Form(...),
     email: str = Form(...),
     full_name: str = Form(None),
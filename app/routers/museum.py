@@ -90,7 +90,7 @@ def get_inventory(
     return JSONResponse(content=data)
 
 @router.post("/api/update_layout")
-async def update_layout(
+def update_layout(
     data: Dict = Body(...),
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(get_current_user)
@@ -120,7 +120,7 @@ async def update_layout(
     return {"status": "success"}
 
 @router.post("/api/update_theme")
-async def update_theme(
+def update_theme(
     data: Dict = Body(...),
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(get_current_user)
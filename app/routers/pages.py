@@ -1,11 +1,20 @@
-from fastapi import APIRouter, Request, Depends, Form
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse # <--- Added HTMLResponse here
+from fastapi import APIRouter, Request, Depends, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response # <--- Added HTMLResponse here
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import String, func, literal, or_, select, tuple_, type_coerce
+import base64
+from datetime import datetime
 
-from .. import models, database
-from .auth import get_current_user
+from .. import models, database, facets
+from .. import search as full_text
+from ..notifications import mark_read, push
+from ..tags import popular_tags_query
+from ..view_counter import view_counter
+from ..liked_cache import is_liked, liked_ids
+from .auth import get_current_user, get_current_user_async
 
 router = APIRouter(
     tags=["pages"]
@@ -13,83 +22,256 @@ router = APIRouter(
 
 templates = Jinja2Templates(directory="app/templates")
 
-@router.get("/")
-async def home(
-    request: Request, 
-    search: str = None, 
-    category: str = None,
-    era: str = None,
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(get_current_user)
-):
-    query = db.query(models.Artifact)
+# Cards per feed page, and comments previewed under each card.
+FEED_PAGE_SIZE = 12
+FEED_PREVIEW_COMMENTS = 2
+# Artifacts per corridor segment of the 3D gallery (/artifacts_json?limit=).
+GALLERY_SEGMENT_SIZE = 20
+GALLERY_SEGMENT_MAX = 100
+# Tags shown above the home feed, and the most /tags returns.
+TAG_CLOUD_SIZE = 20
+TAG_LIST_MAX = 500
+# Notifications per inbox page.
+NOTIFICATIONS_PAGE_SIZE = 20
+
+async def latest_comments(db: AsyncSession, artifact_ids: list, per_artifact: int = FEED_PREVIEW_COMMENTS) -> dict:
+    """{artifact_id: its newest comments, oldest first}, in one windowed query however many artifacts."""
+    if not artifact_ids:
+        return {}
+    ranked = select(
+        models.Comment.id,
+        func.row_number().over(
+            partition_by=models.Comment.artifact_id,
+            order_by=(models.Comment.created_at.desc(), models.Comment.id.desc())
+        ).label("rank")
+    ).where(models.Comment.artifact_id.in_(artifact_ids)).subquery()
+    result = await db.execute(
+        select(models.Comment)
+        .join(ranked, ranked.c.id == models.Comment.id)
+        .where(ranked.c.rank <= per_artifact)
+        .order_by(models.Comment.artifact_id, models.Comment.created_at, models.Comment.id)
+        .options(selectinload(models.Comment.user))
+    )
+    comments = {}
+    for comment in result.scalars():
+        comments.setdefault(comment.artifact_id, []).append(comment)
+    return comments
+
+def encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode("|".join(str(v) for v in values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, *types) -> tuple:
+    """Split a cursor back into its values, converted with `types`; 400 if it doesn't fit."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        values = raw.split("|")
+        if len(values) != len(types):
+            raise ValueError(cursor)
+        return tuple(convert(value) for convert, value in zip(types, values))
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def time_key(column):
+    """A created_at column as keyset cursors compare it."""
+    # SQLite keeps DateTime as text, and rows stamped by CURRENT_TIMESTAMP lack
+    # the microseconds a bound datetime is written with, so a row would sort
+    # before its own cursor; there the stored text itself is compared. Other
+    # databases compare real timestamps.
+    return type_coerce(column, String) if database.IS_SQLITE else column
+
+def encode_time(value) -> str:
+    return value if isinstance(value, str) else value.isoformat(timespec="microseconds")
+
+def decode_time(value: str):
+    return value if database.IS_SQLITE else datetime.fromisoformat(value)
+
+async def newest_page(db: AsyncSession, search: str, category: str, era: str, tag: str, cursor: str, limit: int) -> tuple:
+    """(artifacts, next cursor), newest first."""
+    # Keyset pagination on (created_at, id): a page starts strictly after the
+    # last card of the previous one, so deep pages cost the same as the first
+    # and new posts don't shift what comes next. The cursor carries created_at
+    # as time_key compares it, so rows sharing a timestamp are neither skipped
+    # nor repeated.
+    if tag:
+        # A tag's links hold a copy of each artifact's created_at, so the page
+        # is read in order from ix_artifact_tags_tag_created.
+        created_at, artifact_id = models.ArtifactTag.created_at, models.ArtifactTag.artifact_id
+    else:
+        created_at, artifact_id = models.Artifact.created_at, models.Artifact.id
+    created_key = time_key(created_at)
+    # Cards show comments_count and a short preview, never the full comment list.
+    query = select(models.Artifact, created_key.label("created_key")).options(
+        selectinload(models.Artifact.creator), selectinload(models.Artifact.tag_items)
+    )
+
+    if tag:
+        query = query.select_from(models.ArtifactTag).join(
+            models.Artifact, models.Artifact.id == models.ArtifactTag.artifact_id
+        ).where(models.ArtifactTag.tag_id == (
+            select(models.Tag.id).where(models.Tag.slug == tag.lower()).scalar_subquery()
+        ))
     
     if search:
+        # Only used when full-text search is unavailable.
         search_filter = or_(
             models.Artifact.title.ilike(f"%{search}%"),
             models.Artifact.tags.ilike(f"%{search}%"),
             models.Artifact.category.ilike(f"%{search}%")
         )
-        query = query.filter(search_filter)
+        query = query.where(search_filter)
     
     if category:
-        query = query.filter(models.Artifact.category == category)
+        query = query.where(models.Artifact.category == category)
 
     if era:
-        query = query.filter(models.Artifact.era == era)
+        query = query.where(models.Artifact.era == era)
+
+    if cursor:
+        after_created, after_id = decode_cursor(cursor, decode_time, int)
+        query = query.where(tuple_(created_key, artifact_id) < tuple_(literal(after_created, created_key.type), after_id))
         
-    artifacts = query.order_by(models.Artifact.created_at.desc()).all()
-    
-    # Get unique categories for filter dropdown
-    categories = db.query(models.Artifact.category).distinct().all()
-    categories = [c[0] for c in categories if c[0]]
+    result = await db.execute(
+        query.order_by(created_at.desc(), artifact_id.desc()).limit(limit + 1)
+    )
+    rows = result.all()
+    next_cursor = encode_cursor(encode_time(rows[limit - 1][1]), rows[limit - 1][0].id) if len(rows) > limit else None
+    return [artifact for artifact, _ in rows[:limit]], next_cursor
 
-    liked_artifact_ids = []
-    if current_user:
-        likes = db.query(models.Like).filter(models.Like.user_id == current_user.id).all()
-        liked_artifact_ids = [like.artifact_id for like in likes]
+async def search_page(db: AsyncSession, search: str, category: str, era: str, tag: str, cursor: str, limit: int) -> tuple:
+    """(artifacts, {artifact_id: snippet}, next cursor), best match first."""
+    # Relevance isn't stored anywhere to seek on, and FTS5 scores every match
+    # before sorting anyway, so search pages are plain offsets.
+    offset = decode_cursor(cursor, int)[0] if cursor else 0
+    matches = await full_text.search_artifacts(db, search, limit + 1, offset, category=category, era=era, tag=tag)
+    next_cursor = encode_cursor(offset + limit) if len(matches) > limit else None
+    matches = matches[:limit]
+    result = await db.execute(
+        select(models.Artifact)
+        .where(models.Artifact.id.in_([artifact_id for artifact_id, _ in matches]))
+        .options(selectinload(models.Artifact.creator), selectinload(models.Artifact.tag_items))
+    )
+    by_id = {artifact.id: artifact for artifact in result.scalars()}
+    artifacts = [by_id[artifact_id] for artifact_id, _ in matches if artifact_id in by_id]
+    return artifacts, dict(matches), next_cursor
+
+async def feed_page(
+    db: AsyncSession,
+    current_user: models.User,
+    search: str = None,
+    category: str = None,
+    era: str = None,
+    tag: str = None,
+    cursor: str = None,
+    limit: int = FEED_PAGE_SIZE
+) -> dict:
+    """One page of the feed, newest first (best match first for a search), plus the cursor for the page after it (None at the end)."""
+    if search and full_text.enabled and full_text.match_expression(search):
+        artifacts, snippets, next_cursor = await search_page(db, search, category, era, tag, cursor, limit)
+    else:
+        artifacts, next_cursor = await newest_page(db, search, category, era, tag, cursor, limit)
+        snippets = {}
+    artifact_ids = [artifact.id for artifact in artifacts]
+
+    return {
+        "artifacts": artifacts,
+        "latest_comments": await latest_comments(db, artifact_ids),
+        "liked_artifact_ids": await liked_ids(db, current_user, artifact_ids),
+        "snippets": snippets,
+        "next_cursor": next_cursor,
+    }
+
+# Hot pages run on the async engine. Everything a template touches is
+# loaded up front, since nothing can lazy-load once rendering starts.
+@router.get("/")
+async def home(
+    request: Request, 
+    search: str = None, 
+    category: str = None,
+    era: str = None,
+    tag: str = None,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
+):
+    # The first render is one page; the rest comes from /feed as the reader scrolls.
+    page = await feed_page(db, current_user, search=search, category=category, era=era, tag=tag)
+    
+    # Filter counts come from the in-memory facet cache, not a query.
+    facet_counts = await facets.current(db)
+    result = await db.execute(popular_tags_query(TAG_CLOUD_SIZE))
+    popular_tags = result.scalars().all()
     
-    return templates.TemplateResponse("index.html", {
+    return await run_in_threadpool(templates.TemplateResponse, "index.html", {
         "request": request, 
-        "artifacts": artifacts, 
+        **page,
         "user": current_user,
         "search": search,
-        "categories": categories,
+        "categories": list(facet_counts["categories"]),
+        "era_counts": facet_counts["eras"],
+        "popular_tags": popular_tags,
         "selected_era": era,
-        "liked_artifact_ids": liked_artifact_ids
+        "selected_tag": tag.lower() if tag else None
     })
 
+@router.get("/feed")
+async def feed(
+    cursor: str = None,
+    search: str = None, 
+    category: str = None,
+    era: str = None,
+    tag: str = None,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
+):
+    # The next page for infinite scroll: rendered cards plus the cursor after them.
+    page = await feed_page(db, current_user, search=search, category=category, era=era, tag=tag, cursor=cursor)
+    html = await run_in_threadpool(templates.get_template("feed_cards.html").render, {**page, "user": current_user})
+    return {"html": html, "count": len(page["artifacts"]), "next_cursor": page["next_cursor"]}
+
+@router.get("/facets")
+async def get_facets(request: Request, db: AsyncSession = Depends(database.get_async_db)):
+    # Artifact counts per category and era. The version doubles as an ETag,
+    # so a client that already has this version gets an empty 304.
+    facet_counts = await facets.current(db)
+    etag = f'"{facet_counts["version"]}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(facet_counts, headers={"ETag": etag})
+
+@router.get("/tags")
+async def list_tags(limit: int = 100, db: AsyncSession = Depends(database.get_async_db)):
+    # Counts are precomputed on the tags themselves, so this reads one index.
+    result = await db.execute(popular_tags_query(max(1, min(limit, TAG_LIST_MAX))))
+    return [{"name": t.name, "slug": t.slug, "count": t.artifacts_count} for t in result.scalars()]
+
 @router.get("/artifact/{artifact_id}")
 async def artifact_detail(
     request: Request, 
     artifact_id: int, 
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
-    artifact = db.query(models.Artifact).filter(models.Artifact.id == artifact_id).first()
+    result = await db.execute(
+        select(models.Artifact)
+        .where(models.Artifact.id == artifact_id)
+        .options(
+            selectinload(models.Artifact.creator),
+            selectinload(models.Artifact.tag_items),
+            selectinload(models.Artifact.comments).selectinload(models.Comment.user)
+        )
+    )
+    artifact = result.scalars().first()
     if not artifact:
         return templates.TemplateResponse("index.html", {"request": request, "error": "Artifact not found", "user": current_user})
     
-    # Increment view count
-    artifact.views_count += 1
-    db.commit()
+    # Counted in memory and written behind in batches (app/view_counter.py);
+    # the page shows the stored count plus this worker's unwritten views.
+    views_count = (artifact.views_count or 0) + view_counter.add(artifact_id)
     
-    is_liked = False
     collection_status = "none" # none, pending, approved
 
     if current_user:
-        existing_like = db.query(models.Like).filter(
-            models.Like.user_id == current_user.id,
-            models.Like.artifact_id == artifact_id
-        ).first()
-        if existing_like:
-            is_liked = True
-            
         # Check collection status
-        collection_entry = db.query(models.Collection).filter(
-            models.Collection.user_id == current_user.id,
-            models.Collection.artifact_id == artifact_id
-        ).first()
+        collection_entry = await db.get(models.Collection, (current_user.id, artifact_id))
         
         if collection_entry:
             if collection_entry.is_approved:
@@ -97,16 +279,17 @@ async def artifact_detail(
             else:
                 collection_status = "pending"
 
-    return templates.TemplateResponse("artifact_detail.html", {
+    return await run_in_threadpool(templates.TemplateResponse, "artifact_detail.html", {
         "request": request, 
         "artifact": artifact, 
+        "views_count": views_count,
         "user": current_user,
-        "is_liked": is_liked,
+        "is_liked": await is_liked(db, current_user, artifact_id),
         "collection_status": collection_status
     })
 
 @router.get("/upload")
-async def upload_page(
+def upload_page(
     request: Request, 
     current_user: models.User = Depends(get_current_user)
 ):
@@ -116,7 +299,7 @@ async def upload_page(
     return templates.TemplateResponse("upload_artifact.html", {"request": request, "user": current_user})
 
 @router.get("/my-artifacts")
-async def my_artifacts(
+def my_artifacts(
     request: Request, 
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(get_current_user)
@@ -163,34 +346,101 @@ def world_3d(
         "total_likes": total_likes
     })
 
+def gallery_item(art: models.Artifact) -> dict:
+    return {
+        "id": art.id,
+        "title": art.title,
+        "media_url": art.media_url if art.media_url else "https://via.placeholder.com/300",
+        "likes": art.likes_count or 0,
+        "description": art.short_description,
+        "era": art.era
+    }
+
 # 2. A JSON endpoint for the JS to fetch artifact data
 @router.get("/artifacts_json")
-def get_artifacts_json(
+async def get_artifacts_json(
     era: str = None,
-    db: Session = Depends(database.get_db)
+    limit: int = None,
+    cursor: str = None,
+    start: int = None,
+    db: AsyncSession = Depends(database.get_async_db)
 ):
-    # Fetch all artifacts, sorted by likes_count descending
-    query = db.query(models.Artifact)
+    # Gallery order: likes descending (models.gallery_likes), then id. An
+    # artifact's slot in that order is its position along the corridor.
+    query = select(models.Artifact)
     
     if era:
-        query = query.filter(models.Artifact.era == era)
-        
-    artifacts = query.order_by(models.Artifact.likes_count.desc(), models.Artifact.id.asc()).all()
-    # Convert to simple list of dicts
-    data = []
-    for art in artifacts:
-        data.append({
-            "id": art.id,
-            "title": art.title,
-            "media_url": art.media_url if art.media_url else "https://via.placeholder.com/300",
-            "likes": art.likes_count,
-            "description": art.short_description,
-            "era": art.era
-        })
-    return JSONResponse(content=data)
+        query = query.where(models.Artifact.era == era)
+
+    if limit is None and cursor is None and start is None:
+        # Whole gallery at once, for callers that don't stream (e.g. the tour).
+        result = await db.execute(query.order_by(models.gallery_likes.desc(), models.Artifact.id.asc()))
+        return JSONResponse(content=[gallery_item(art) for art in result.scalars().all()])
+
+    # One corridor segment: continuing after the cursor's (likes, id), or, for
+    # a segment the player walks back to, starting at a slot. Slots follow the
+    # likes as they are when each segment is read, so a like in between can
+    # move an artifact by a slot across a segment boundary.
+    limit = max(1, min(limit or GALLERY_SEGMENT_SIZE, GALLERY_SEGMENT_MAX))
+    artifacts = []
+    if cursor:
+        after_likes, after_id, start = decode_cursor(cursor, int, int, int)
+        # The order mixes directions, so it isn't one row-value range; the rest
+        # of the cursor's likes tier and the tiers below are two index seeks.
+        result = await db.execute(
+            query.where(models.gallery_likes == after_likes, models.Artifact.id > after_id)
+            .order_by(models.Artifact.id.asc()).limit(limit + 1)
+        )
+        artifacts = result.scalars().all()
+        query = query.where(models.gallery_likes < after_likes)
+    else:
+        # Walks the index up to the slot; segments ahead use the cursor.
+        start = max(0, start or 0)
+        query = query.offset(start)
+    if len(artifacts) <= limit:
+        result = await db.execute(
+            query.order_by(models.gallery_likes.desc(), models.Artifact.id.asc()).limit(limit + 1 - len(artifacts))
+        )
+        artifacts += result.scalars().all()
+
+    next_cursor = None
+    if len(artifacts) > limit:
+        last = artifacts[limit - 1]
+        next_cursor = encode_cursor(last.likes_count or 0, last.id, start + limit)
+    return JSONResponse(content={
+        "start": start,
+        "artifacts": [{**gallery_item(art), "slot": start + i} for i, art in enumerate(artifacts[:limit])],
+        "next_cursor": next_cursor
+    })
+
+@router.get("/notifications/unread_count")
+def unread_notifications_count(current_user: models.User = Depends(get_current_user)):
+    # For clients without a live connection; connected ones get pushes.
+    if not current_user:
+        return {"unread": 0}
+    return {"unread": current_user.unread_notifications_count or 0}
+
+def inbox_page(db: Session, user: models.User, cursor: str = None, limit: int = NOTIFICATIONS_PAGE_SIZE) -> tuple:
+    """(notifications, next cursor), newest first."""
+    # Keyset pagination on (created_at, id), read in order from
+    # ix_notifications_recipient_created, as newest_page does for the feed.
+    created_key = time_key(models.Notification.created_at)
+    query = (
+        select(models.Notification, created_key.label("created_key"))
+        .where(models.Notification.recipient_id == user.id)
+        .options(selectinload(models.Notification.sender), selectinload(models.Notification.artifact))
+    )
+    if cursor:
+        after_created, after_id = decode_cursor(cursor, decode_time, int)
+        query = query.where(tuple_(created_key, models.Notification.id) < tuple_(literal(after_created, created_key.type), after_id))
+    rows = db.execute(
+        query.order_by(models.Notification.created_at.desc(), models.Notification.id.desc()).limit(limit + 1)
+    ).all()
+    next_cursor = encode_cursor(encode_time(rows[limit - 1][1]), rows[limit - 1][0].id) if len(rows) > limit else None
+    return [notification for notification, _ in rows[:limit]], next_cursor
 
 @router.get("/notifications")
-async def notifications_page(
+def notifications_page(
     request: Request,
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(get_current_user)
@@ -198,18 +448,47 @@ async def notifications_page(
     if not current_user:
         return RedirectResponse(url="/login", status_code=303)
     
-    notifications = db.query(models.Notification)\
-        .filter(models.Notification.recipient_id == current_user.id)\
-        .order_by(models.Notification.created_at.desc())\
-        .all()
-    
-    # Mark all as read
-    for notif in notifications:
-        notif.is_read = True
+    # Mark all as read, in one statement
+    unread = mark_read(db, current_user)
     db.commit()
+    # Clear the badge in the user's other open tabs
+    push(current_user.username, {"type": "unread", "count": unread})
+    
+    # Only the first page, read after the commit so nothing on it is expired;
+    # the rest comes from /notifications/page as the reader scrolls.
+    notifications, next_cursor = inbox_page(db, current_user)
     
     return templates.TemplateResponse("notifications.html", {
         "request": request,
         "user": current_user,
-        "notifications": notifications
+        "unread_count": unread,
+        "notifications": notifications,
+        "next_cursor": next_cursor
     })
+
+@router.get("/notifications/page")
+def notifications_more(
+    cursor: str = None,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    # The next page for infinite scroll, like /feed.
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Login required")
+    notifications, next_cursor = inbox_page(db, current_user, cursor)
+    html = templates.get_template("notification_items.html").render({"notifications": notifications})
+    return {"html": html, "count": len(notifications), "next_cursor": next_cursor}
+
+@router.post("/notifications/read")
+def mark_notifications_read(
+    up_to: int = Form(None),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    # Marks everything, or only notifications up to the newest one the client has shown.
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Login required")
+    unread = mark_read(db, current_user, up_to)
+    db.commit()
+    push(current_user.username, {"type": "unread", "count": unread})
+    return {"unread": unread}
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field
+from typing import Optional, List, Literal
 from datetime import datetime
 
 # User Schemas
@@ -59,3 +59,26 @@ class Artifact(ArtifactBase):
 
     class Config:
         from_attributes = True
+
+# WebSocket Schemas
+# Coordinates beyond this are not a place anyone can walk to in the museum.
+COORDINATE_LIMIT = 1e5
+
+class Vec3(BaseModel):
+    x: float = Field(allow_inf_nan=False, ge=-COORDINATE_LIMIT, le=COORDINATE_LIMIT)
+    y: float = Field(allow_inf_nan=False, ge=-COORDINATE_LIMIT, le=COORDINATE_LIMIT)
+    z: float = Field(allow_inf_nan=False, ge=-COORDINATE_LIMIT, le=COORDINATE_LIMIT)
+
+class AvatarFrame(BaseModel):
+    type: Optional[Literal["hello", "pong", "subscribe", "unsubscribe"]] = None
+    # subscribe / unsubscribe
+    channel: Optional[str] = Field(None, min_length=1, max_length=128)
+    resume: Optional[str] = Field(None, max_length=512)
+    # Avatar state
+    userId: Optional[str] = Field(None, min_length=1, max_length=64)
+    username: Optional[str] = Field(None, max_length=64)
+    likes: Optional[int] = Field(None, ge=0)
+    avatarType: Optional[Literal["Engineer", "Hipster", "Shadow", "Speedster"]] = None
+    color: Optional[str] = Field(None, pattern=r"^#[0-9a-fA-F]{3,8}$")
+    position: Optional[Vec3] = None
+    rotation: Optional[Vec3] = None
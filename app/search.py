@@ -0,0 +1,149 @@
+import os
+import re
+
+from markupsafe import Markup, escape
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.database import IS_SQLITE
+
+# --- FULL-TEXT SEARCH ---
+# artifacts_fts is an FTS5 index over each artifact's text and its creator's
+# username, keyed by artifact id. Triggers keep it in step with every write to
+# artifacts (and to users.username), so nothing in the app has to remember to.
+# Where FTS5 isn't available (another database, or a SQLite built without it)
+# search falls back to LIKE.
+SEARCH_SNIPPET_TOKENS = int(os.getenv("SEARCH_SNIPPET_TOKENS", "16"))
+# bm25 column weights, in column order: a hit in the title counts for more
+# than one buried in the long description.
+SEARCH_WEIGHTS = (10.0, 4.0, 1.0, 6.0, 3.0, 3.0)
+
+COLUMNS = ("title", "short_description", "long_description", "tags", "category", "username")
+# Control characters can't appear in stored text, so they mark snippet hits
+# safely; they become <mark> only after the snippet has been HTML-escaped.
+_HIT_START, _HIT_END = "\x02", "\x03"
+_TERM = re.compile(r"\w+")
+_RANK = f"bm25({', '.join(str(weight) for weight in SEARCH_WEIGHTS)})"
+
+SCHEMA = [
+    # prefix= keeps 2-4 character prefix indexes, so "vas*" doesn't walk every term.
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS artifacts_fts USING fts5(
+        {", ".join(COLUMNS)},
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS artifacts_fts_insert AFTER INSERT ON artifacts BEGIN
+        INSERT INTO artifacts_fts (rowid, title, short_description, long_description, tags, category, username)
+        VALUES (new.id, new.title, new.short_description, new.long_description, new.tags, new.category,
+                (SELECT username FROM users WHERE id = new.creator_id));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS artifacts_fts_update
+    AFTER UPDATE OF title, short_description, long_description, tags, category, creator_id ON artifacts BEGIN
+        UPDATE artifacts_fts SET
+            title = new.title, short_description = new.short_description,
+            long_description = new.long_description, tags = new.tags, category = new.category,
+            username = (SELECT username FROM users WHERE id = new.creator_id)
+        WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS artifacts_fts_delete AFTER DELETE ON artifacts BEGIN
+        DELETE FROM artifacts_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS artifacts_fts_username AFTER UPDATE OF username ON users BEGIN
+        UPDATE artifacts_fts SET username = new.username
+        WHERE rowid IN (SELECT id FROM artifacts WHERE creator_id = new.id);
+    END""",
+]
+
+# The whole index from scratch. NOT EXISTS makes it a no-op if another worker
+# filled the index first, all in one statement.
+_FILL = """
+    INSERT INTO artifacts_fts (rowid, title, short_description, long_description, tags, category, username)
+    SELECT artifacts.id, artifacts.title, artifacts.short_description, artifacts.long_description,
+           artifacts.tags, artifacts.category, users.username
+    FROM artifacts LEFT JOIN users ON users.id = artifacts.creator_id
+    WHERE NOT EXISTS (SELECT 1 FROM artifacts_fts)
+"""
+
+enabled = False
+
+
+def install(engine) -> bool:
+    """Create the index and its triggers if they're missing, filling a new index from artifacts."""
+    global enabled
+    if not IS_SQLITE:
+        return False
+    try:
+        with engine.begin() as conn:
+            for statement in SCHEMA:
+                conn.exec_driver_sql(statement)
+            filled = conn.exec_driver_sql(_FILL).rowcount
+    except OperationalError as e:
+        print(f"WARNING: Full-text search unavailable, falling back to LIKE: {e.orig}")
+        return False
+    if filled > 0:
+        print(f"INFO: Indexed {filled} artifacts for full-text search")
+    enabled = True
+    return True
+
+
+def rebuild(conn) -> int:
+    """Drop and recreate the index and triggers, refill it and merge its segments; returns rows indexed."""
+    conn.exec_driver_sql("DROP TABLE IF EXISTS artifacts_fts")
+    for statement in SCHEMA:
+        conn.exec_driver_sql(statement)
+    indexed = conn.exec_driver_sql(_FILL).rowcount
+    conn.exec_driver_sql("INSERT INTO artifacts_fts (artifacts_fts) VALUES ('optimize')")
+    return indexed
+
+
+def match_expression(query: str):
+    """An FTS5 MATCH string for what a reader typed: every word must match, each as a prefix.
+
+    Words are quoted, so FTS5 syntax in the input (AND, NEAR, column:, quotes)
+    is searched for as plain text. None if the input has no words at all.
+    """
+    terms = _TERM.findall(query)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def highlight(snippet: str) -> Markup:
+    """A snippet as safe HTML, with its hits wrapped in <mark>."""
+    return Markup(str(escape(snippet)).replace(_HIT_START, "<mark>").replace(_HIT_END, "</mark>"))
+
+
+async def search_artifacts(db, query: str, limit: int, offset: int = 0, category: str = None, era: str = None,
+                           tag: str = None) -> list:
+    """[(artifact id, snippet)] for the best matches first (BM25), or [] if nothing matches."""
+    expression = match_expression(query)
+    if expression is None:
+        return []
+    # ORDER BY rank lets FTS5 sort the matches itself, so snippet() only runs
+    # for the rows returned. Filters join artifacts with CROSS JOIN, which
+    # keeps the index as the outer loop: as the inner one it would be searched
+    # again for every artifact in the era or category.
+    source = "artifacts_fts"
+    filters = ""
+    params = {"match": expression, "limit": limit, "offset": offset}
+    if category or era or tag:
+        source += " CROSS JOIN artifacts ON artifacts.id = artifacts_fts.rowid"
+        if category:
+            filters += " AND artifacts.category = :category"
+            params["category"] = category
+        if era:
+            filters += " AND artifacts.era = :era"
+            params["era"] = era
+        if tag:
+            filters += """ AND artifacts.id IN (SELECT artifact_tags.artifact_id FROM artifact_tags
+                           JOIN tags ON tags.id = artifact_tags.tag_id WHERE tags.slug = :tag)"""
+            params["tag"] = tag.lower()
+    result = await db.execute(text(f"""
+        SELECT artifacts_fts.rowid,
+               snippet(artifacts_fts, -1, '{_HIT_START}', '{_HIT_END}', '…', {SEARCH_SNIPPET_TOKENS})
+        FROM {source}
+        WHERE artifacts_fts MATCH :match AND rank MATCH '{_RANK}'{filters}
+        ORDER BY rank
+        LIMIT :limit OFFSET :offset
+    """), params)
+    return [(artifact_id, highlight(snippet)) for artifact_id, snippet in result.all()]
@@ -0,0 +1,49 @@
+import math
+
+
+class SpatialGrid:
+    """Uniform grid over the museum floor (x, z) mapping cells to player ids."""
+
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self.cells: dict = {}   # {(cx, cz): {player_id}}
+        self.where: dict = {}   # {player_id: (cx, cz)}
+
+    def cell_for(self, x: float, z: float) -> tuple:
+        return (math.floor(x / self.cell_size), math.floor(z / self.cell_size))
+
+    def move(self, player_id, x: float, z: float) -> tuple:
+        cell = self.cell_for(x, z)
+        old = self.where.get(player_id)
+        if old != cell:
+            if old is not None:
+                self._discard(player_id, old)
+            self.cells.setdefault(cell, set()).add(player_id)
+            self.where[player_id] = cell
+        return cell
+
+    def remove(self, player_id):
+        cell = self.where.pop(player_id, None)
+        if cell is not None:
+            self._discard(player_id, cell)
+
+    def cell_of(self, player_id):
+        return self.where.get(player_id)
+
+    def nearby(self, cell: tuple, radius: int) -> set:
+        """Ids of all players within `radius` cells of `cell` (a square neighbourhood)."""
+        cx, cz = cell
+        found = set()
+        for dx in range(-radius, radius + 1):
+            for dz in range(-radius, radius + 1):
+                players = self.cells.get((cx + dx, cz + dz))
+                if players:
+                    found |= players
+        return found
+
+    def _discard(self, player_id, cell: tuple):
+        players = self.cells.get(cell)
+        if players is not None:
+            players.discard(player_id)
+            if not players:
+                del self.cells[cell]
@@ -0,0 +1,86 @@
+import re
+
+from sqlalchemy import literal, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import insert_for
+
+# --- TAGS ---
+# Artifact.tags keeps the comma-separated string as written (the search index
+# reads it); tags and artifact_tags hold the same tags normalised, with
+# Tag.artifacts_count as the precomputed frequency for tag clouds. Every route
+# that sets or removes an artifact's tags goes through tag_artifact /
+# untag_artifact, in the same transaction as the artifact itself.
+TAG_MAX_LENGTH = 64
+TAGS_PER_ARTIFACT = 20
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def parse_tags(raw: str) -> list:
+    """Tag names from a comma-separated string: trimmed, blanks dropped, duplicates (any case) once."""
+    names = {}
+    for part in (raw or "").split(","):
+        name = _WHITESPACE.sub(" ", part).strip()[:TAG_MAX_LENGTH]
+        if name and name.lower() not in names:
+            names[name.lower()] = name
+    return list(names.values())[:TAGS_PER_ARTIFACT]
+
+
+def insert_ignoring_duplicates(db: Session, model, rows: list):
+    db.execute(insert_for(db)(model).values(rows).on_conflict_do_nothing())
+
+
+def tag_artifact(db: Session, artifact: models.Artifact):
+    """Link a new (flushed) artifact to the tags in artifact.tags, creating tags that don't exist yet."""
+    names = parse_tags(artifact.tags)
+    if not names:
+        return
+    # Inserting with ON CONFLICT DO NOTHING, rather than checking first, lets
+    # two workers add the same new tag at once.
+    insert_ignoring_duplicates(db, models.Tag, [{"slug": name.lower(), "name": name, "artifacts_count": 0}
+                                                for name in names])
+    tag_ids = db.execute(
+        select(models.Tag.id).where(models.Tag.slug.in_([name.lower() for name in names]))
+    ).scalars().all()
+    # Each link carries the artifact's created_at, so a tag's artifacts can be
+    # read newest first straight from ix_artifact_tags_tag_created.
+    links = (
+        select(literal(artifact.id), models.Tag.id, models.Artifact.created_at)
+        .join(models.Artifact, models.Artifact.id == artifact.id)
+        .where(models.Tag.id.in_(tag_ids))
+    )
+    db.execute(
+        insert_for(db)(models.ArtifactTag)
+        .from_select(["artifact_id", "tag_id", "created_at"], links)
+        .on_conflict_do_nothing()
+    )
+    db.execute(
+        update(models.Tag).where(models.Tag.id.in_(tag_ids))
+        .values(artifacts_count=models.Tag.artifacts_count + 1)
+    )
+
+
+def untag_artifact(db: Session, artifact: models.Artifact):
+    """Unlink an artifact that is about to be deleted from its tags."""
+    tag_ids = db.execute(
+        select(models.ArtifactTag.tag_id).where(models.ArtifactTag.artifact_id == artifact.id)
+    ).scalars().all()
+    if not tag_ids:
+        return
+    db.execute(
+        update(models.Tag).where(models.Tag.id.in_(tag_ids))
+        .values(artifacts_count=models.Tag.artifacts_count - 1)
+    )
+    db.query(models.ArtifactTag).filter(models.ArtifactTag.artifact_id == artifact.id).delete(synchronize_session=False)
+
+
+def popular_tags_query(limit: int):
+    """The most used tags, most used first: a walk down ix_tags_count."""
+    return (
+        select(models.Tag)
+        .where(models.Tag.artifacts_count > 0)
+        .order_by(models.Tag.artifacts_count.desc(), models.Tag.slug)
+        .limit(limit)
+    )
@@ -0,0 +1,84 @@
+import asyncio
+import os
+from collections import Counter
+
+from sqlalchemy import bindparam, func, update
+
+from app import models
+from app.database import async_engine
+
+# --- VIEW COUNTER ---
+# Artifact page views are counted in memory and written behind in batches,
+# so readers of a popular artifact never wait on the database write lock.
+# Each worker flushes its own counts every VIEW_FLUSH_INTERVAL seconds, or
+# sooner once VIEW_FLUSH_THRESHOLD views are waiting, and once more on
+# shutdown. Stored counts lag by at most one interval.
+VIEW_FLUSH_INTERVAL = float(os.getenv("VIEW_FLUSH_INTERVAL", "5"))
+VIEW_FLUSH_THRESHOLD = int(os.getenv("VIEW_FLUSH_THRESHOLD", "1000"))
+
+_ADD_VIEWS = (
+    update(models.Artifact.__table__)
+    .where(models.Artifact.__table__.c.id == bindparam("artifact_id"))
+    .values(views_count=func.coalesce(models.Artifact.__table__.c.views_count, 0) + bindparam("views"))
+)
+
+
+class ViewCounter:
+    def __init__(self, engine=async_engine):
+        self.engine = engine
+        self.pending = Counter()  # {artifact_id: views not yet written}
+        self.pending_total = 0
+        self.wake = asyncio.Event()
+        self.task = None
+        self.stats = {"views": 0, "flushes": 0, "rows_written": 0, "failed_flushes": 0}
+
+    def add(self, artifact_id: int) -> int:
+        """Count a view; returns this worker's views of the artifact that aren't stored yet."""
+        self.pending[artifact_id] += 1
+        self.pending_total += 1
+        self.stats["views"] += 1
+        if self.pending_total >= VIEW_FLUSH_THRESHOLD:
+            self.wake.set()
+        return self.pending[artifact_id]
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wake.wait(), VIEW_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write every pending view in one transaction: one UPDATE ... + ? per artifact."""
+        if not self.pending:
+            return
+        # Swapped out first, so views counted while the write is in flight
+        # go into the next batch.
+        batch, self.pending, self.pending_total = self.pending, Counter(), 0
+        rows = [{"artifact_id": artifact_id, "views": views} for artifact_id, views in sorted(batch.items())]
+        try:
+            async with self.engine.begin() as conn:
+                await conn.execute(_ADD_VIEWS, rows)
+        except Exception as e:
+            # Kept for the next flush rather than lost.
+            self.pending.update(batch)
+            self.pending_total += sum(batch.values())
+            self.stats["failed_flushes"] += 1
+            print(f"WARNING: Flushing {len(rows)} artifact view counts failed: {e}")
+            return
+        self.stats["flushes"] += 1
+        self.stats["rows_written"] += len(rows)
+
+
+view_counter = ViewCounter()
@@ -0,0 +1,118 @@
+import struct
+
+# --- WIRE PROTOCOLS ---
+# Clients pick a format through the WebSocket subprotocol. JSON stays the
+# fallback for clients that ask for nothing (or for something we don't know).
+SUBPROTOCOL_JSON = "museum.json.v1"
+SUBPROTOCOL_BINARY = "museum.bin.v1"
+
+# Client -> server motion frame: position x, y, z then rotation x, y, z as
+# little-endian float32 (24 bytes). The player is implied by the socket.
+MOTION_FRAME = struct.Struct("<6f")
+
+# Server -> client snapshot:
+#   header:         u8 message type, u32 tick, u16 player count, u16 left count
+#   per player:     u16 player id, u8 field mask, [3 x f32 position], [3 x f32 rotation]
+#   per departure:  u16 player id
+# Profile fields (username, avatarType, ...) never travel in binary; they are sent
+# once as a JSON "profile" message that maps each player id to its userId.
+SNAPSHOT_HEADER = struct.Struct("<BIHH")
+ENTRY_HEADER = struct.Struct("<HB")
+VEC3 = struct.Struct("<3f")
+PLAYER_ID = struct.Struct("<H")
+
+MSG_SNAPSHOT = 1
+HAS_POSITION = 1
+HAS_ROTATION = 2
+
+MAX_PLAYER_ID = 0xFFFF
+
+
+def negotiate(requested: list):
+    """Pick the subprotocol to accept, or None if the client asked for none."""
+    if SUBPROTOCOL_BINARY in requested:
+        return SUBPROTOCOL_BINARY
+    if SUBPROTOCOL_JSON in requested:
+        return SUBPROTOCOL_JSON
+    return None
+
+
+def _vec3(value: dict) -> tuple:
+    return (float(value["x"]), float(value["y"]), float(value["z"]))
+
+
+def encode_motion_frame(position: dict, rotation: dict) -> bytes:
+    return MOTION_FRAME.pack(*_vec3(position), *_vec3(rotation))
+
+
+def decode_motion_frame(data: bytes) -> dict:
+    px, py, pz, rx, ry, rz = MOTION_FRAME.unpack(data)
+    return {
+        "position": {"x": px, "y": py, "z": pz},
+        "rotation": {"x": rx, "y": ry, "z": rz},
+    }
+
+
+def encode_snapshot(message: dict, pids: dict) -> bytes:
+    """Pack the motion part of a snapshot message; players without motion are skipped."""
+    entries = []
+    for player in message.get("players", []):
+        pid = pids.get(player["userId"])
+        if pid is None:
+            continue
+        mask = 0
+        body = b""
+        try:
+            if "position" in player:
+                body += VEC3.pack(*_vec3(player["position"]))
+                mask |= HAS_POSITION
+            if "rotation" in player:
+                body += VEC3.pack(*_vec3(player["rotation"]))
+                mask |= HAS_ROTATION
+        except (KeyError, TypeError, ValueError, struct.error):
+            continue
+        if mask:
+            entries.append(ENTRY_HEADER.pack(pid, mask) + body)
+
+    left = [pids[uid] for uid in message.get("left", []) if uid in pids]
+    header = SNAPSHOT_HEADER.pack(MSG_SNAPSHOT, message.get("tick", 0) & 0xFFFFFFFF, len(entries), len(left))
+    return header + b"".join(entries) + b"".join(PLAYER_ID.pack(pid) for pid in left)
+
+
+def decode_snapshot(data: bytes) -> dict:
+    _, tick, count, left_count = SNAPSHOT_HEADER.unpack_from(data, 0)
+    offset = SNAPSHOT_HEADER.size
+    players = []
+    for _ in range(count):
+        pid, mask = ENTRY_HEADER.unpack_from(data, offset)
+        offset += ENTRY_HEADER.size
+        player = {"pid": pid}
+        if mask & HAS_POSITION:
+            x, y, z = VEC3.unpack_from(data, offset)
+            player["position"] = {"x": x, "y": y, "z": z}
+            offset += VEC3.size
+        if mask & HAS_ROTATION:
+            x, y, z = VEC3.unpack_from(data, offset)
+            player["rotation"] = {"x": x, "y": y, "z": z}
+            offset += VEC3.size
+        players.append(player)
+    left = []
+    for _ in range(left_count):
+        left.append(PLAYER_ID.unpack_from(data, offset)[0])
+        offset += PLAYER_ID.size
+    return {"type": "snapshot", "tick": tick, "players": players, "left": left}
+
+
+def profile_message(message: dict, pids: dict, profile_fields: tuple):
+    """The JSON side-channel for binary clients: profile fields keyed by player id."""
+    players = []
+    for player in message.get("players", []):
+        profile = {field: player[field] for field in profile_fields if field in player}
+        if profile and player["userId"] in pids:
+            players.append({"userId": player["userId"], "pid": pids[player["userId"]], **profile})
+    if message.get("full"):
+        # Sent even when empty: it tells the client who is (not) in the room.
+        return {"type": "profile", "full": True, "players": players}
+    if not players:
+        return None
+    return {"type": "profile", "players": players}
@@ -0,0 +1,73 @@
+"""
+Online backup of the SQLite database through SQLite's backup API.
+
+By default the whole database is copied in one step, inside a single read
+transaction: in WAL mode that never blocks writers and the copy is a
+consistent snapshot of the moment it started. The copy is integrity-checked
+and switched to a self-contained rollback journal before it is kept; backups
+beyond --keep are deleted, oldest first.
+
+    python backup_db.py [--dest backups] [--keep 7]
+    python backup_db.py --pages 1024   # copy in steps (restarts if the source changes)
+"""
+import argparse
+import glob
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from app.database import IS_SQLITE, SQLITE_BUSY_TIMEOUT_MS, engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dest", default="backups", help="directory to write backups to")
+    parser.add_argument("--keep", type=int, default=7, help="number of backups to keep (0 = all)")
+    parser.add_argument("--pages", type=int, default=-1, help="pages per backup step (-1 = all at once)")
+    args = parser.parse_args()
+
+    if not IS_SQLITE:
+        sys.exit("backup_db.py only handles SQLite databases.")
+
+    source_path = engine.url.database
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    os.makedirs(args.dest, exist_ok=True)
+    target = os.path.join(args.dest, f"{stem}-{datetime.utcnow():%Y%m%d-%H%M%S}.db")
+    partial = target + ".partial"
+
+    source = sqlite3.connect(source_path)
+    source.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    dest = sqlite3.connect(partial)
+    started = time.monotonic()
+
+    def progress(status, remaining, total):
+        print(f"  copied {total - remaining}/{total} pages")
+
+    try:
+        source.backup(dest, pages=args.pages, progress=progress if args.pages > 0 else None, sleep=0.05)
+        # The copy inherits WAL mode from the source; a backup is easier to move
+        # around as a single file.
+        dest.execute("PRAGMA journal_mode=DELETE")
+        result = dest.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        dest.close()
+        source.close()
+
+    if result != "ok":
+        os.remove(partial)
+        sys.exit(f"Backup failed its integrity check: {result}")
+    os.replace(partial, target)
+    size_mb = os.path.getsize(target) / 1024 / 1024
+    print(f"Backed up {source_path} to {target} ({size_mb:.1f} MB in {time.monotonic() - started:.1f}s)")
+
+    if args.keep > 0:
+        backups = sorted(glob.glob(os.path.join(args.dest, f"{stem}-*.db")))
+        for old in backups[:-args.keep]:
+            os.remove(old)
+            print(f"Removed old backup {old}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Home-page search benchmark: FTS5 (app/search.py) against the old LIKE filter.
+
+Builds a throwaway database with --artifacts artifacts of generated text
+(kept between runs unless --reseed), then times one feed page of results for
+each query both ways: the three ILIKE '%term%' clauses ordered by created_at,
+and the ranked FTS5 match with snippets. Also reports how many rows each
+way matches, since LIKE finds substrings inside words and FTS5 whole-word
+prefixes.
+
+    python bench_search.py                        # 100k artifacts
+    python bench_search.py --artifacts 20000 --repeat 20
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.gettempdir(), "virtual_museum_search_bench.db")
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+ERAS = ["Ancient", "Medieval", "Industrial", "Modern", "Future"]
+CATEGORIES = ["Art", "Science", "History", "Technology", "Nature"]
+THEMES = ("amphora bronze ceramic vase mosaic fresco tapestry sword helmet coin manuscript scroll "
+          "telescope compass engine lantern clock portrait sculpture relic fossil crystal loom "
+          "printing press steam locomotive radio camera satellite circuit robot hologram "
+          "ancient roman greek egyptian gothic baroque victorian modern futuristic golden "
+          "painted carved woven forged restored rare fragile ornate weathered").split()
+SYLLABLES = "ka ri to mu se la no vi pe do ga lu ne hi so ta ze mo ru fi".split()
+VOCABULARY = 20_000
+# Word frequencies follow Zipf's law, as in real descriptions: a few words
+# appear in most artifacts and most words in very few. The theme words are
+# spread across the ranks, so the queries below range from common to rare.
+QUERIES = ["ancient", "bronze vase", "rob", "locomotive steam restored", "weathered", "user_42", "nonexistent"]
+PAGE = 12
+
+
+def vocabulary(rng: random.Random) -> tuple:
+    filler = sorted({"".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(VOCABULARY * 2)}
+                    - set(THEMES))
+    rng.shuffle(filler)
+    words = filler[:VOCABULARY - len(THEMES)]
+    for i, theme in enumerate(THEMES):
+        words.insert(i * i * 4, theme)
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    return words, list(itertools.accumulate(weights))
+
+
+def sentence(rng: random.Random, words: tuple, length: int) -> str:
+    return " ".join(rng.choices(words[0], cum_weights=words[1], k=length))
+
+
+def seed(count: int, users: int = 200):
+    """Bulk-insert straight through the driver; the FTS triggers index every row."""
+    from app import database
+
+    rng = random.Random(42)
+    words = vocabulary(rng)
+    with database.engine.begin() as conn:
+        if conn.exec_driver_sql("SELECT COUNT(*) FROM artifacts").scalar() >= count:
+            return
+        print(f"Seeding {count} artifacts...")
+        conn.exec_driver_sql("DELETE FROM artifacts")
+        conn.exec_driver_sql("DELETE FROM users")
+        conn.exec_driver_sql(
+            "INSERT INTO users (id, username, email, hashed_password) VALUES (?, ?, ?, '-')",
+            [(i + 1, f"user_{i}", f"user_{i}@example.com") for i in range(users)],
+        )
+        conn.exec_driver_sql(
+            """INSERT INTO artifacts (title, creator_id, short_description, long_description, era, category,
+                   tags, media_type, media_url, views_count, likes_count, comments_count, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, 'image', '/static/placeholder.png', 0, 0, 0,
+                   datetime('2024-01-01', ? || ' seconds'))""",
+            [(sentence(rng, words, 3).title(), i % users + 1, sentence(rng, words, 10), sentence(rng, words, 60),
+              ERAS[i % len(ERAS)], CATEGORIES[i % len(CATEGORIES)], ", ".join(rng.sample(THEMES, 3)), i)
+             for i in range(count)],
+        )
+        conn.exec_driver_sql("INSERT INTO artifacts_fts (artifacts_fts) VALUES ('optimize')")
+
+
+async def run(repeat: int):
+    from sqlalchemy import func, or_, select, text
+
+    from app import database, models, search
+
+    async def like_page(db, term):
+        result = await db.execute(
+            select(models.Artifact.id)
+            .where(or_(models.Artifact.title.ilike(f"%{term}%"),
+                       models.Artifact.tags.ilike(f"%{term}%"),
+                       models.Artifact.category.ilike(f"%{term}%")))
+            .order_by(models.Artifact.created_at.desc(), models.Artifact.id.desc())
+            .limit(PAGE + 1)
+        )
+        return result.all()
+
+    async def like_total(db, term):
+        return await db.scalar(select(func.count()).select_from(models.Artifact).where(or_(
+            models.Artifact.title.ilike(f"%{term}%"),
+            models.Artifact.tags.ilike(f"%{term}%"),
+            models.Artifact.category.ilike(f"%{term}%"))))
+
+    async def fts_total(db, term):
+        return await db.scalar(text("SELECT COUNT(*) FROM artifacts_fts WHERE artifacts_fts MATCH :match"),
+                               {"match": search.match_expression(term)})
+
+    async def timed(fn, db, term):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await fn(db, term)
+            samples.append((time.perf_counter() - started) * 1000)
+        return statistics.median(samples), max(samples)
+
+    async with database.AsyncSessionLocal() as db:
+        print(f"{'query':<28}{'LIKE p50/max ms':>18}{'FTS5 p50/max ms':>18}{'LIKE rows':>11}{'FTS5 rows':>11}")
+        for term in QUERIES:
+            like_p50, like_max = await timed(like_page, db, term)
+            fts_p50, fts_max = await timed(lambda db, term: search.search_artifacts(db, term, PAGE + 1), db, term)
+            print(f"{term:<28}{f'{like_p50:.2f}/{like_max:.2f}':>18}{f'{fts_p50:.2f}/{fts_max:.2f}':>18}"
+                  f"{await like_total(db, term):>11}{await fts_total(db, term):>11}")
+    await database.async_engine.dispose()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--artifacts", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per query")
+    parser.add_argument("--reseed", action="store_true", help="start from an empty database")
+    args = parser.parse_args()
+
+    if args.reseed:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(DB_PATH + suffix):
+                os.remove(DB_PATH + suffix)
+
+    import app.main  # noqa: F401  creates the tables and the search index
+    from app import search
+    if not search.enabled:
+        print("FTS5 is not available in this SQLite build.")
+        return 1
+    seed(args.artifacts)
+    asyncio.run(run(args.repeat))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Compare the JSON and binary avatar wire formats: bytes on the wire and
+encode/decode time per frame.
+
+    python bench_wire.py [--players 50] [--iterations 20000]
+"""
+import argparse
+import json
+import random
+import timeit
+
+from app import wire
+
+PROFILE = {"username": "visitor_42", "likes": 17, "avatarType": "Speedster", "color": "#4CC3D9"}
+
+
+def random_motion():
+    return {
+        "position": {"x": random.uniform(-6, 6), "y": 0.0, "z": random.uniform(-400, 8)},
+        "rotation": {"x": random.uniform(-30, 30), "y": random.uniform(-180, 180), "z": 0.0},
+    }
+
+
+def per_call_us(fn, iterations):
+    return timeit.timeit(fn, number=iterations) / iterations * 1e6
+
+
+def report(name, size, encode_us, decode_us):
+    print(f"  {name:<28} {size:>8} B {encode_us:>10.2f} us {decode_us:>10.2f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=50, help="players per room snapshot")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    random.seed(1)
+    n = args.iterations
+
+    print(f"  {'format':<28} {'size':>10} {'encode':>13} {'decode':>13}")
+
+    # --- client -> server: one avatar frame ---
+    print("Client frame (one avatar, 20 Hz)")
+    motion = random_motion()
+    legacy = {"userId": "user_k3j9x0a1b", **PROFILE, **motion}
+    for name, frame in (("json (full, pre-hello)", legacy), ("json (motion only)", {"userId": "user_k3j9x0a1b", **motion})):
+        text = json.dumps(frame)
+        report(name, len(text.encode()),
+               per_call_us(lambda: json.dumps(frame), n),
+               per_call_us(lambda: json.loads(text), n))
+    data = wire.encode_motion_frame(motion["position"], motion["rotation"])
+    report("binary", len(data),
+           per_call_us(lambda: wire.encode_motion_frame(motion["position"], motion["rotation"]), n),
+           per_call_us(lambda: wire.decode_motion_frame(data), n))
+
+    # --- server -> client: one tick's snapshot ---
+    print(f"Room snapshot ({args.players} moving players, per tick)")
+    pids = {f"user_{i}": i + 1 for i in range(args.players)}
+    message = {
+        "type": "snapshot",
+        "tick": 123456,
+        "players": [{"userId": uid, **random_motion()} for uid in pids],
+    }
+    text = json.dumps(message)
+    report("json", len(text.encode()),
+           per_call_us(lambda: json.dumps(message), n // 10),
+           per_call_us(lambda: json.loads(text), n // 10))
+    data = wire.encode_snapshot(message, pids)
+    report("binary", len(data),
+           per_call_us(lambda: wire.encode_snapshot(message, pids), n // 10),
+           per_call_us(lambda: wire.decode_snapshot(data), n // 10))
+
+
+if __name__ == "__main__":
+    main()
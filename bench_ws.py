@@ -0,0 +1,301 @@
+"""
+WebSocket load generator for the museum rooms.
+
+Starts N simulated avatars spread over M rooms. Each avatar joins its room
+on the multiplexed /ws endpoint, says hello and then sends a motion frame
+at the client's real 20 Hz cadence. Every frame carries its sequence number
+in rotation.y, so whenever a peer sees that frame in a snapshot the harness
+can measure send-to-fan-out latency.
+
+By default the app is served in-process on an ephemeral port, which also
+gives access to the server-side drop counters. Pass --url to load-test a
+server that is already running (for example gunicorn with several workers).
+
+--http-clients adds concurrent HTTP load from a separate process, to see how
+page requests on the same worker affect avatar latency. In-process runs seed
+the bench database with --artifacts artifacts first.
+
+    python bench_ws.py --avatars 100 --rooms 4 --duration 10
+    python bench_ws.py --binary --max-p99-ms 150     # exit 1 on regression
+    python bench_ws.py --http-clients 8 --http-path / --artifacts 300
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+import websockets
+
+from app import wire
+
+FRAME_INTERVAL = 0.05  # museum_3d.html sends every 50 ms
+ERAS = ["Ancient", "Medieval", "Industrial", "Modern", "Future"]
+
+
+class Metrics:
+    def __init__(self):
+        self.sent_at: dict = {}      # {(userId, seq): monotonic send time}
+        self.latencies: list = []    # seconds
+        self.frames_sent = 0
+        self.messages_received = 0
+        self.bytes_received = 0
+        self.errors = 0
+        self.recording = False
+
+
+class Avatar:
+    def __init__(self, index: int, room_id: str, metrics: Metrics, binary: bool, spread: float):
+        self.user_id = f"bench_{index}"
+        self.room_id = room_id
+        self.metrics = metrics
+        self.binary = binary
+        self.x = random.uniform(-3, 3)
+        self.z = -random.uniform(0, spread)
+        self.seq = 0
+        self.last_seen: dict = {}    # {userId: highest seq seen}
+        self.pid_to_user: dict = {}
+
+    async def run(self, base_url: str, stop: asyncio.Event):
+        protocols = [wire.SUBPROTOCOL_BINARY] if self.binary else [wire.SUBPROTOCOL_JSON]
+        try:
+            async with websockets.connect(f"{base_url}/ws", subprotocols=protocols, max_queue=None) as ws:
+                await ws.send(json.dumps({"type": "subscribe", "channel": f"room:{self.room_id}"}))
+                await ws.send(json.dumps({
+                    "type": "hello", "userId": self.user_id, "username": self.user_id,
+                    "likes": 0, "avatarType": "Engineer", "color": "#4CC3D9",
+                }))
+                reader = asyncio.create_task(self._read(ws))
+                # Stagger start so frames don't all land on the same instant.
+                await asyncio.sleep(random.uniform(0, FRAME_INTERVAL))
+                next_send = time.monotonic()
+                while not stop.is_set():
+                    await self._send(ws)
+                    next_send += FRAME_INTERVAL
+                    await asyncio.sleep(max(0.0, next_send - time.monotonic()))
+                reader.cancel()
+        except Exception as e:
+            self.metrics.errors += 1
+            print(f"{self.user_id}: {e!r}", file=sys.stderr)
+
+    async def _send(self, ws):
+        self.seq += 1
+        self.z -= 0.01
+        position = {"x": self.x, "y": 0.0, "z": self.z}
+        rotation = {"x": 0.0, "y": float(self.seq), "z": 0.0}
+        if self.metrics.recording:
+            self.metrics.sent_at[(self.user_id, self.seq)] = time.monotonic()
+            self.metrics.frames_sent += 1
+        if self.binary:
+            await ws.send(wire.encode_motion_frame(position, rotation))
+        else:
+            await ws.send(json.dumps({"userId": self.user_id, "position": position, "rotation": rotation}))
+
+    async def _read(self, ws):
+        async for raw in ws:
+            now = time.monotonic()
+            if isinstance(raw, bytes):
+                message = wire.decode_snapshot(raw)
+                for player in message["players"]:
+                    player["userId"] = self.pid_to_user.get(player["pid"])
+            else:
+                message = json.loads(raw)
+                if message.get("type") == "profile":
+                    for player in message["players"]:
+                        self.pid_to_user[player["pid"]] = player["userId"]
+            if not self.metrics.recording:
+                continue
+            self.metrics.messages_received += 1
+            self.metrics.bytes_received += len(raw)
+            for player in message.get("players", []):
+                user_id = player.get("userId")
+                rotation = player.get("rotation")
+                if not user_id or user_id == self.user_id or not rotation:
+                    continue
+                seq = int(round(rotation["y"]))
+                # Snapshots may repeat a frame (far-tick catch-up); count each once.
+                if seq <= self.last_seen.get(user_id, 0):
+                    continue
+                self.last_seen[user_id] = seq
+                sent = self.metrics.sent_at.get((user_id, seq))
+                if sent is not None:
+                    self.metrics.latencies.append(now - sent)
+
+
+def seed_database(count: int):
+    """Make sure the bench database holds at least `count` artifacts, with comments."""
+    from app import database, models
+
+    db = database.SessionLocal()
+    try:
+        existing = db.query(models.Artifact).count()
+        if existing >= count:
+            return
+        user = db.query(models.User).filter(models.User.username == "bench").first()
+        if user is None:
+            user = models.User(username="bench", email="bench@example.com", hashed_password="-")
+            db.add(user)
+            db.commit()
+        for i in range(existing, count):
+            artifact = models.Artifact(
+                title=f"Bench artifact {i}", creator_id=user.id,
+                short_description="Seeded by bench_ws.py", long_description="",
+                era=ERAS[i % len(ERAS)], category=["Art", "Science", "History"][i % 3],
+                tags="bench, sample", media_type="image", media_url="/static/placeholder.png",
+                likes_count=i % 17, comments_count=3,
+            )
+            artifact.comments = [models.Comment(user_id=user.id, text=f"Comment {j}") for j in range(3)]
+            db.add(artifact)
+        db.commit()
+    finally:
+        db.close()
+
+
+def http_load(base_url: str, path: str, clients: int, warmup: float, duration: float, results):
+    """Runs in a child process so generating the load doesn't share the server's event loop."""
+    async def client(http, stop, latencies, errors, recording):
+        while not stop.is_set():
+            started = time.monotonic()
+            try:
+                response = await http.get(path)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors.append(1)
+                continue
+            if recording.is_set():
+                latencies.append(time.monotonic() - started)
+
+    async def run():
+        stop, recording = asyncio.Event(), asyncio.Event()
+        latencies, errors = [], []
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as http:
+            tasks = [asyncio.create_task(client(http, stop, latencies, errors, recording)) for _ in range(clients)]
+            await asyncio.sleep(warmup)
+            recording.set()
+            await asyncio.sleep(duration)
+            recording.clear()
+            stop.set()
+            await asyncio.gather(*tasks)
+        results.put((latencies, len(errors)))
+
+    asyncio.run(run())
+
+
+async def serve_in_process():
+    """Run the app on an ephemeral port in this event loop; returns (server, url, manager)."""
+    os.environ.setdefault("SECRET_KEY", "bench")
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/virtual_museum_bench.db")
+    import uvicorn
+    from app.main import app
+    from app.realtime import manager
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, task, f"ws://127.0.0.1:{port}", manager
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def main(args) -> int:
+    random.seed(args.seed)
+    server = task = manager = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        server, task, base_url, manager = await serve_in_process()
+        dropped_before = dict(manager.stats)
+
+    if args.artifacts and not args.url:
+        seed_database(args.artifacts)
+
+    http_process = None
+    if args.http_clients:
+        results = multiprocessing.Queue()
+        http_process = multiprocessing.Process(target=http_load, args=(
+            base_url.replace("ws", "http", 1), args.http_path, args.http_clients,
+            args.warmup, args.duration, results))
+        http_process.start()
+
+    metrics = Metrics()
+    stop = asyncio.Event()
+    avatars = [Avatar(i, f"bench_room_{i % args.rooms}", metrics, args.binary, args.spread)
+               for i in range(args.avatars)]
+    runners = [asyncio.create_task(a.run(base_url, stop)) for a in avatars]
+
+    await asyncio.sleep(args.warmup)
+    metrics.recording = True
+    started = time.monotonic()
+    await asyncio.sleep(args.duration)
+    metrics.recording = False
+    elapsed = time.monotonic() - started
+    stop.set()
+    await asyncio.gather(*runners)
+
+    lat_ms = [s * 1000 for s in metrics.latencies]
+    print(f"avatars={args.avatars} rooms={args.rooms} format={'binary' if args.binary else 'json'} "
+          f"duration={elapsed:.1f}s target={'in-process' if not args.url else base_url}")
+    print(f"frames sent:        {metrics.frames_sent} ({metrics.frames_sent / elapsed:.0f}/s)")
+    print(f"messages received:  {metrics.messages_received} ({metrics.messages_received / elapsed:.0f}/s, "
+          f"{metrics.bytes_received / elapsed / 1024:.0f} KiB/s)")
+    print(f"fan-out deliveries: {len(lat_ms)}")
+    if lat_ms:
+        print(f"latency ms:         p50={percentile(lat_ms, 50):.1f} p90={percentile(lat_ms, 90):.1f} "
+              f"p99={percentile(lat_ms, 99):.1f} max={max(lat_ms):.1f} mean={statistics.mean(lat_ms):.1f}")
+    if manager is not None:
+        dropped = manager.stats["frames_dropped"] - dropped_before["frames_dropped"]
+        kicked = manager.stats["slow_disconnects"] - dropped_before["slow_disconnects"]
+        print(f"server drops:       {dropped} frames dropped, {kicked} slow clients disconnected")
+    if http_process is not None:
+        http_lat, http_errors = await asyncio.to_thread(results.get)
+        http_process.join()
+        http_ms = [s * 1000 for s in http_lat]
+        print(f"http GET {args.http_path}: {len(http_ms)} requests ({len(http_ms) / elapsed:.0f}/s) "
+              f"from {args.http_clients} clients, {http_errors} errors")
+        if http_ms:
+            print(f"http latency ms:    p50={percentile(http_ms, 50):.1f} p99={percentile(http_ms, 99):.1f}")
+    print(f"client errors:      {metrics.errors}")
+
+    if server is not None:
+        server.should_exit = True
+        await task
+
+    if args.max_p99_ms is not None and (not lat_ms or percentile(lat_ms, 99) > args.max_p99_ms):
+        print(f"FAIL: p99 latency above {args.max_p99_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--avatars", type=int, default=50, help="simulated players (N)")
+    parser.add_argument("--rooms", type=int, default=1, help="rooms to spread them over (M)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to measure")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds before measuring")
+    parser.add_argument("--spread", type=float, default=8.0,
+                        help="corridor length in metres the avatars start in (larger = fewer near peers)")
+    parser.add_argument("--binary", action="store_true", help="use the museum.bin.v1 wire format")
+    parser.add_argument("--url", help="target a running server, e.g. ws://127.0.0.1:8000")
+    parser.add_argument("--http-clients", type=int, default=0, help="concurrent HTTP clients running alongside")
+    parser.add_argument("--http-path", default="/", help="page the HTTP clients request")
+    parser.add_argument("--artifacts", type=int, default=200, help="artifacts to seed the in-process database with")
+    parser.add_argument("--max-p99-ms", type=float, help="exit 1 if p99 fan-out latency exceeds this")
+    parser.add_argument("--seed", type=int, default=1)
+    sys.exit(asyncio.run(main(parser.parse_args())))
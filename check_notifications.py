@@ -0,0 +1,131 @@
+"""
+Notification coalescing check.
+
+Seeds a throwaway database, then likes and comments through the TestClient
+as several users and checks what the artifact owner's inbox ends up with:
+one row per type, an actor_count of distinct senders (repeat likes and
+comments from the same user aren't counted twice), the merged wording, an
+unread count that matches the unread rows, and no actor rows left behind once
+the inbox is read. Exits 1 on any mismatch.
+
+    python check_notifications.py
+"""
+import os
+import sys
+import tempfile
+
+DB_PATH = os.path.join(tempfile.gettempdir(), "virtual_museum_notifications.db")
+os.environ.setdefault("SECRET_KEY", "notifications")
+os.environ.setdefault("OPENAI_API_KEY", "notifications")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+for suffix in ("", "-wal", "-shm"):
+    if os.path.exists(DB_PATH + suffix):
+        os.remove(DB_PATH + suffix)
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func
+
+from app import database, models
+from app.main import app
+from app.routers.auth import create_access_token
+
+USERS = ["alice", "bob", "carol", "dave"]
+
+
+def seed() -> int:
+    db = database.SessionLocal()
+    users = [models.User(username=name, email=f"{name}@example.com", hashed_password="-") for name in USERS]
+    db.add_all(users)
+    db.flush()
+    vase = models.Artifact(title="Vase", creator_id=users[0].id, short_description="A vase", era="Ancient",
+                           category="Art", media_type="image", media_url="/vase.jpg")
+    db.add(vase)
+    db.commit()
+    artifact_id = vase.id
+    db.close()
+    return artifact_id
+
+
+def inbox(artifact_id: int, type: str) -> list:
+    db = database.SessionLocal()
+    rows = db.query(models.Notification).filter_by(artifact_id=artifact_id, type=type).all()
+    result = [(n.actor_count, n.message) for n in rows]
+    db.close()
+    return result
+
+
+def unread() -> tuple:
+    """alice's (stored unread count, unread rows)."""
+    db = database.SessionLocal()
+    alice = db.query(models.User).filter_by(username="alice").one()
+    rows = db.query(func.count(models.Notification.id)).filter_by(recipient_id=alice.id, is_read=False).scalar()
+    result = (alice.unread_notifications_count, rows)
+    db.close()
+    return result
+
+
+def actors() -> int:
+    db = database.SessionLocal()
+    result = db.query(func.count()).select_from(models.NotificationActor).scalar()
+    db.close()
+    return result
+
+
+def main():
+    artifact_id = seed()
+    client = TestClient(app)
+    failures = 0
+
+    def act(name: str, action: str, text: str = None):
+        client.cookies.set("access_token", f"Bearer {create_access_token({'sub': name})}")
+        if action == "read":
+            response = client.get("/notifications")
+        elif action == "like":
+            response = client.post(f"/artifacts/{artifact_id}/like", headers={"accept": "application/json"})
+        else:
+            response = client.post(f"/artifacts/{artifact_id}/comment", data={"text": text}, follow_redirects=False)
+        assert response.status_code < 400, response.status_code
+
+    def check(name: str, actual, expected):
+        nonlocal failures
+        if actual == expected:
+            print(f"ok   {name}")
+        else:
+            print(f"FAIL {name}\n    expected {expected!r}\n    got      {actual!r}")
+            failures += 1
+
+    with client:
+        for action in ("like", "like", "like"):  # like, unlike, like again
+            act("bob", action)
+        check("repeat likes from one user", inbox(artifact_id, "like"), [(1, "bob liked your artifact 'Vase'")])
+
+        act("carol", "like")
+        act("bob", "like")
+        act("bob", "like")
+        check("second liker, then a repeat", inbox(artifact_id, "like"),
+              [(2, "carol and 1 other liked your artifact 'Vase'")])
+
+        act("bob", "comment", "First!")
+        act("bob", "comment", "And again")
+        check("repeat comments from one user", inbox(artifact_id, "comment"),
+              [(1, "bob commented: And again...")])
+
+        act("dave", "comment", "Lovely")
+        act("bob", "comment", "Third time")
+        check("second commenter, then a repeat", inbox(artifact_id, "comment"),
+              [(2, "dave and 1 other commented on your artifact 'Vase'")])
+
+        check("unread count matches unread rows", unread(), (2, 2))
+
+        act("alice", "read")
+        check("actors dropped once read", actors(), 0)
+        act("bob", "like")  # unlike
+        act("bob", "like")
+        check("a like after reading starts a new row", [len(inbox(artifact_id, "like")), actors()], [2, 1])
+
+    print(f"{failures} failures")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
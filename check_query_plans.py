@@ -0,0 +1,192 @@
+"""
+Query-plan regression check.
+
+Seeds a throwaway database, calls each route through the TestClient while
+recording every SQL statement it runs, then asks SQLite for each statement's
+EXPLAIN QUERY PLAN. Exits 1 if any statement reads a whole table without an
+index ("SCAN <table>"), unless the scan is listed in ALLOWED_SCANS with the
+reason it can't be avoided. Sorts that need a temporary B-tree are reported
+but don't fail the check.
+
+The database is not ANALYZEd, so SQLite assumes every table is large: the
+plans show whether an index can serve each query, whatever the seed size.
+
+    python check_query_plans.py            # fails on a full table scan
+    python check_query_plans.py --verbose  # print every plan
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+DB_PATH = os.path.join(tempfile.gettempdir(), "virtual_museum_plans.db")
+os.environ.setdefault("SECRET_KEY", "plans")
+os.environ.setdefault("OPENAI_API_KEY", "plans")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+for suffix in ("", "-wal", "-shm"):
+    if os.path.exists(DB_PATH + suffix):
+        os.remove(DB_PATH + suffix)
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import database, models
+from app.main import app
+from app.routers.auth import create_access_token
+from app.tags import tag_artifact
+
+ERAS = ["Ancient", "Medieval", "Industrial", "Modern", "Future"]
+ARTIFACTS = 500
+USERS = 50
+
+# (route, table) -> why reading every row is expected there.
+ALLOWED_SCANS = {}
+
+# (name, method, path, form data); every request is made as user_0. {next_cursor}
+# is the cursor returned by the latest paginated response.
+ROUTES = [
+    ("GET /", "GET", "/", None),
+    ("GET /?era", "GET", "/?era=Ancient", None),
+    ("GET /?category", "GET", "/?category=Art", None),
+    ("GET /?search", "GET", "/?search=artif", None),
+    ("GET /feed?search&cursor", "GET", "/feed?search=artifact&cursor={next_cursor}", None),
+    ("GET /feed?search&era", "GET", "/feed?search=artifact&era=Ancient", None),
+    ("GET /feed?search&tag", "GET", "/feed?search=artifact&tag=batch+3", None),
+    ("GET /?tag", "GET", "/?tag=batch+3", None),
+    ("GET /feed?tag", "GET", "/feed?tag=sample", None),
+    ("GET /feed?tag&cursor", "GET", "/feed?tag=sample&cursor={next_cursor}", None),
+    ("GET /tags", "GET", "/tags", None),
+    ("GET /facets", "GET", "/facets", None),
+    ("GET /feed", "GET", "/feed", None),
+    ("GET /feed?cursor", "GET", "/feed?cursor={next_cursor}", None),
+    ("GET /feed?era&cursor", "GET", "/feed?era=Ancient&cursor={next_cursor}", None),
+    ("GET /feed?category&cursor", "GET", "/feed?category=Art&cursor={next_cursor}", None),
+    ("GET /artifact/{id}", "GET", "/artifact/10", None),
+    ("GET /artifacts_json", "GET", "/artifacts_json", None),
+    ("GET /artifacts_json?era", "GET", "/artifacts_json?era=Medieval", None),
+    ("GET /artifacts_json?limit", "GET", "/artifacts_json?era=Medieval&limit=20", None),
+    ("GET /artifacts_json?limit&cursor", "GET", "/artifacts_json?era=Medieval&limit=20&cursor={next_cursor}", None),
+    ("GET /artifacts_json?cursor", "GET", "/artifacts_json?limit=20&cursor={next_cursor}", None),
+    ("GET /artifacts_json?start", "GET", "/artifacts_json?era=Medieval&limit=20&start=40", None),
+    ("GET /my-artifacts", "GET", "/my-artifacts", None),
+    ("GET /notifications/unread_count", "GET", "/notifications/unread_count", None),
+    ("GET /notifications", "GET", "/notifications", None),
+    ("GET /notifications/page", "GET", "/notifications/page", None),
+    ("GET /notifications/page?cursor", "GET", "/notifications/page?cursor={next_cursor}", None),
+    ("POST /notifications/read", "POST", "/notifications/read", {"up_to": "400"}),
+    ("GET /museum/{user}", "GET", "/museum/user_1", None),
+    ("GET /museum/api/{user}/artifacts", "GET", "/museum/api/user_1/artifacts", None),
+    ("GET /museum/api/{user}/inventory", "GET", "/museum/api/user_0/inventory", None),
+    ("POST /artifacts/{id}/like", "POST", "/artifacts/11/like", None),
+    ("POST /artifacts/{id}/comment", "POST", "/artifacts/11/comment", {"text": "Plan check"}),
+    ("POST /artifacts/{id}/request_collection", "POST", "/artifacts/12/request_collection", None),
+]
+
+FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+
+
+def seed():
+    db = database.SessionLocal()
+    users = [models.User(username=f"user_{i}", email=f"user_{i}@example.com", hashed_password="-")
+             for i in range(USERS)]
+    db.add_all(users)
+    db.flush()
+    artifacts = []
+    for i in range(ARTIFACTS):
+        artifacts.append(models.Artifact(
+            title=f"Artifact {i}", creator_id=users[i % USERS].id,
+            short_description="Seeded by check_query_plans.py", long_description="",
+            era=ERAS[i % len(ERAS)], category=["Art", "Science", "History"][i % 3],
+            tags=f"sample, {ERAS[i % len(ERAS)]}, batch {i % 10}", media_type="image", media_url="/static/placeholder.png",
+            likes_count=i % 37, comments_count=3, is_placed=i % 4 == 0,
+        ))
+    db.add_all(artifacts)
+    db.flush()
+    for i, artifact in enumerate(artifacts):
+        tag_artifact(db, artifact)
+        db.add_all([models.Comment(artifact_id=artifact.id, user_id=users[(i + j) % USERS].id, text="Nice")
+                    for j in range(3)])
+        db.add(models.Notification(recipient_id=artifact.creator_id, sender_id=users[(i + 1) % USERS].id,
+                                   artifact_id=artifact.id, type="like", message="Someone liked it"))
+        if i % 10 == 0:
+            # Enough for user_0's inbox to run to several pages.
+            db.add(models.Notification(recipient_id=users[0].id, sender_id=users[(i + 1) % USERS].id,
+                                       artifact_id=artifact.id, type="comment", message="Someone commented"))
+        if i % 5 == 0:
+            db.add(models.Like(user_id=users[(i + 2) % USERS].id, artifact_id=artifact.id))
+        if i % 9 == 0:
+            db.add(models.Collection(user_id=users[(i + 3) % USERS].id, artifact_id=artifact.id))
+    db.commit()
+    db.close()
+
+
+def record_statements(log: list):
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        log.append((statement, parameters))
+
+    for engine in (database.engine, database.async_engine.sync_engine):
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def explain(conn: sqlite3.Connection, statement: str, parameters) -> list:
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + statement, parameters or ())]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verbose", action="store_true", help="print every statement's plan")
+    args = parser.parse_args()
+
+    seed()
+    statements = []
+    record_statements(statements)
+    client = TestClient(app)
+    client.cookies.set("access_token", f"Bearer {create_access_token({'sub': 'user_0'})}")
+    plans = sqlite3.connect(DB_PATH)
+    tables = set(database.Base.metadata.tables)
+
+    failures = sorts = 0
+    next_cursor = ""
+    for name, method, path, data in ROUTES:
+        statements.clear()
+        response = client.request(method, path.format(next_cursor=next_cursor), data=data, follow_redirects=False)
+        if response.status_code >= 400:
+            print(f"FAIL {name}: HTTP {response.status_code}")
+            failures += 1
+            continue
+        if "cursor" in path or "limit" in path or path.startswith(("/feed", "/notifications/page")):
+            next_cursor = response.json()["next_cursor"] or ""
+        seen = set()
+        route_failures = 0
+        for statement, parameters in statements:
+            if not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")) or statement in seen:
+                continue
+            seen.add(statement)
+            plan = explain(plans, statement, parameters)
+            one_line = " ".join(statement.split())
+            if args.verbose:
+                print(f"{name}: {one_line}\n    " + "\n    ".join(plan))
+            for detail in plan:
+                match = FULL_SCAN.match(detail)
+                # Scans of materialized subqueries (anon_1, subquery-3) are fine.
+                if match and match.group(1) in tables and (name, match.group(1)) not in ALLOWED_SCANS:
+                    print(f"FAIL {name}: full scan of {match.group(1)}\n    {one_line}")
+                    route_failures += 1
+                elif "USE TEMP B-TREE" in detail:
+                    print(f"note {name}: {detail.lower()}\n    {one_line[:160]}...")
+                    sorts += 1
+        failures += route_failures
+        if not route_failures:
+            print(f"ok   {name}: {len(seen)} statements")
+
+    plans.close()
+    print(f"{len(ROUTES)} routes checked, {failures} full scans, {sorts} temporary sorts")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
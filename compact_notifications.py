@@ -0,0 +1,79 @@
+"""
+Delete read informational notifications older than the retention period,
+optionally archiving them to a JSON Lines file first.
+
+Only informational notifications are deleted (COMPACTED_TYPES). A pending
+collection_request is the owner's only way to approve or decline, so it is
+kept however old, and once handled it becomes request_handled, which is
+compacted. Unread notifications are always kept, so unread counts don't
+change. The table is walked in primary key order, one short transaction
+per batch, so the app's writers only ever wait for a single batch.
+
+    python compact_notifications.py [--days 90] [--batch 1000]
+    python compact_notifications.py --archive notifications-archive.jsonl
+    python compact_notifications.py --dry-run   # count only
+"""
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select
+
+from app.database import engine
+from app import models
+
+NOTIFICATION_RETENTION_DAYS = float(os.getenv("NOTIFICATION_RETENTION_DAYS", "90"))
+COMPACTED_TYPES = ("like", "comment", "collection_approved", "collection_declined", "request_handled")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=float, default=NOTIFICATION_RETENTION_DAYS, help="keep read notifications this long")
+    parser.add_argument("--batch", type=int, default=1000, help="rows examined per transaction")
+    parser.add_argument("--archive", help="append deleted notifications to this JSON Lines file")
+    parser.add_argument("--dry-run", action="store_true", help="count what would be deleted without deleting it")
+    args = parser.parse_args()
+
+    table = models.Notification.__table__
+    cutoff = datetime.utcnow() - timedelta(days=args.days)
+    archive = open(args.archive, "a") if args.archive and not args.dry_run else None
+    expired_total = 0
+    after = 0
+    try:
+        while True:
+            with engine.begin() as conn:
+                # The batch is a range of ids, so each one is a primary key seek.
+                last = conn.execute(
+                    select(func.max(table.c.id)).where(
+                        table.c.id.in_(select(table.c.id).where(table.c.id > after).order_by(table.c.id).limit(args.batch))
+                    )
+                ).scalar()
+                if last is None:
+                    break
+                expired = (table.c.id > after, table.c.id <= last, table.c.is_read == True,
+                           table.c.created_at < cutoff, table.c.type.in_(COMPACTED_TYPES))
+                rows = conn.execute(select(table).where(*expired)).mappings().all()
+                if archive:
+                    for row in rows:
+                        archive.write(json.dumps(dict(row), default=str) + "\n")
+                    archive.flush()
+                if rows and not args.dry_run:
+                    ids = [row["id"] for row in rows]
+                    conn.execute(delete(models.NotificationActor).where(models.NotificationActor.notification_id.in_(ids)))
+                    conn.execute(delete(table).where(table.c.id.in_(ids)))
+                expired_total += len(rows)
+                after = last
+    finally:
+        if archive:
+            archive.close()
+
+    action = "Would delete" if args.dry_run else "Deleted"
+    print(f"{action} {expired_total} read notifications older than {args.days:g} days (before {cutoff:%Y-%m-%d %H:%M})")
+    with engine.connect() as conn:
+        print(f"{conn.execute(select(func.count()).select_from(table)).scalar()} notifications remain")
+
+
+if __name__ == "__main__":
+    main()
+    print("Done!")
@@ -0,0 +1,22 @@
+"""
+Rebuild the full-text search index (artifacts_fts) from scratch.
+
+The app creates and fills the index on first start and its triggers keep it
+current after that, so this is only needed to repair it, or after changing
+its columns or tokenizer in app/search.py. The rebuild runs in one
+transaction: searches keep seeing the old index until it commits.
+"""
+import time
+
+from app.database import engine, IS_SQLITE
+from app import search
+
+if not IS_SQLITE:
+    print("Full-text search needs SQLite with FTS5; nothing to rebuild.")
+else:
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        indexed = search.rebuild(conn)
+    print(f"Indexed {indexed} artifacts in {time.perf_counter() - started:.1f}s")
+
+print("Done!")
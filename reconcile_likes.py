@@ -0,0 +1,61 @@
+"""
+Recount artifacts.likes_count from the likes table and report any drift.
+
+The like route keeps the counter in step in SQL, so drift should only come
+from before that (lost updates between concurrent taps) or from writes that
+bypass the route. The fix is a single UPDATE, so it is atomic with respect to
+likes arriving while it runs; only artifacts whose count is off are written.
+
+    python reconcile_likes.py              # report, then fix
+    python reconcile_likes.py --dry-run    # report only
+"""
+import argparse
+
+from sqlalchemy import func, select, update
+
+from app.database import engine
+from app import models
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="report drift without fixing it")
+    parser.add_argument("--show", type=int, default=10, help="number of the most drifted artifacts to list")
+    args = parser.parse_args()
+
+    # The recount looks likes up by artifact; without this index it would
+    # read the whole likes table once per artifact.
+    for index in models.Like.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+    actual = (
+        select(func.count())
+        .where(models.Like.artifact_id == models.Artifact.id)
+        .scalar_subquery()
+    )
+
+    with engine.begin() as conn:
+        drifted = conn.execute(
+            select(models.Artifact.id, models.Artifact.title, models.Artifact.likes_count, actual)
+            .where(models.Artifact.likes_count.is_distinct_from(actual))
+        ).all()
+        over = sum((count or 0) - likes for _, _, count, likes in drifted if (count or 0) > likes)
+        under = sum(likes - (count or 0) for _, _, count, likes in drifted if (count or 0) < likes)
+        print(f"{len(drifted)} artifacts drifted: {over} likes over-counted, {under} under-counted")
+        worst = sorted(drifted, key=lambda row: abs((row[2] or 0) - row[3]), reverse=True)[:args.show]
+        for artifact_id, title, count, likes in worst:
+            print(f"  #{artifact_id} {title!r}: stored {count}, actual {likes}")
+
+        if args.dry_run or not drifted:
+            return
+        result = conn.execute(
+            update(models.Artifact).where(models.Artifact.likes_count.is_distinct_from(actual))
+            .values(likes_count=actual)
+            .execution_options(synchronize_session=False)
+        )
+        print(f"Recounted likes_count on {result.rowcount} artifacts")
+
+
+if __name__ == "__main__":
+    main()
+    print("Done!")
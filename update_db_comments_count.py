@@ -0,0 +1,24 @@
+"""
+Add artifacts.comments_count and fill it from the comments table.
+
+Safe to run again: the column is only added once, and the backfill simply
+recounts, which also repairs counts that have drifted.
+"""
+from sqlalchemy import inspect
+
+from app.database import engine
+
+with engine.begin() as conn:
+    columns = {column["name"] for column in inspect(conn).get_columns("artifacts")}
+    if "comments_count" not in columns:
+        conn.exec_driver_sql("ALTER TABLE artifacts ADD COLUMN comments_count INTEGER DEFAULT 0")
+        print("Added comments_count to artifacts")
+
+    result = conn.exec_driver_sql("""
+        UPDATE artifacts
+        SET comments_count = (SELECT COUNT(*) FROM comments WHERE comments.artifact_id = artifacts.id)
+        WHERE comments_count IS NOT (SELECT COUNT(*) FROM comments WHERE comments.artifact_id = artifacts.id)
+    """)
+    print(f"Backfilled comments_count on {result.rowcount} artifacts")
+
+print("Done!")
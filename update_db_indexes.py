@@ -0,0 +1,45 @@
+"""
+Add the indexes declared in app/models.py to an existing database.
+
+create_all() skips tables that already exist, and their new indexes along
+with them, so missing indexes are created one by one, and ones the models
+have replaced are dropped. ANALYZE runs afterwards so the query planner has
+statistics for them straight away.
+"""
+from sqlalchemy import inspect
+
+from app.database import engine, Base, IS_SQLITE
+from app import models
+
+# {table: indexes that models.py no longer declares}
+RETIRED_INDEXES = {
+    # Replaced by ix_artifacts_era_gallery and ix_artifacts_gallery, which
+    # order on likes with NULL counted as 0.
+    "artifacts": ["ix_artifacts_era_likes", "ix_artifacts_likes"],
+}
+
+with engine.begin() as conn:
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            print(f"Table {table.name} is missing; start the app once to create it.")
+            continue
+        if IS_SQLITE:
+            # The inspector leaves out expression indexes on SQLite.
+            existing = set(conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table.name,)
+            ).scalars())
+        else:
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                print(f"Creating {index.name} on {table.name}...")
+                index.create(bind=conn)
+        for name in RETIRED_INDEXES.get(table.name, []):
+            if name in existing:
+                print(f"Dropping {name} on {table.name}...")
+                conn.exec_driver_sql(f"DROP INDEX {name}")
+    if IS_SQLITE:
+        conn.exec_driver_sql("ANALYZE")
+
+print("Done!")
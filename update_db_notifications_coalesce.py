@@ -0,0 +1,40 @@
+"""
+Add notifications.actor_count, the notification_actors table and the index
+used to find the notification a new like or comment is merged into.
+
+Safe to run again: the column, table and index are only added once, and
+each unread like or comment notification's sender is recorded as its first
+actor only if it isn't already. Read notifications are never merged into, so
+any actors they still have are dropped.
+"""
+from sqlalchemy import inspect
+
+from app.database import engine, Base
+from app import models
+from app.notifications import COALESCED_MESSAGES
+
+Base.metadata.create_all(bind=engine, tables=[models.NotificationActor.__table__])
+
+with engine.begin() as conn:
+    columns = {column["name"] for column in inspect(conn).get_columns("notifications")}
+    if "actor_count" not in columns:
+        conn.exec_driver_sql("ALTER TABLE notifications ADD COLUMN actor_count INTEGER DEFAULT 1")
+        print("Added actor_count to notifications")
+    for index in models.Notification.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+    types = ", ".join(f"'{type}'" for type in COALESCED_MESSAGES)
+    result = conn.exec_driver_sql(f"""
+        INSERT INTO notification_actors (notification_id, user_id)
+        SELECT id, sender_id FROM notifications
+        WHERE type IN ({types}) AND sender_id IS NOT NULL AND NOT is_read
+          AND NOT EXISTS (SELECT 1 FROM notification_actors WHERE notification_id = notifications.id)
+    """)
+    print(f"Recorded the sender of {result.rowcount} notifications as their first actor")
+    result = conn.exec_driver_sql("""
+        DELETE FROM notification_actors
+        WHERE notification_id IN (SELECT id FROM notifications WHERE is_read)
+    """)
+    print(f"Dropped {result.rowcount} actors of read notifications")
+
+print("Done!")
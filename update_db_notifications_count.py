@@ -0,0 +1,26 @@
+"""
+Add users.unread_notifications_count and fill it from the notifications table.
+
+Safe to run again: the column is only added once, and the backfill simply
+recounts, which also repairs counts that have drifted.
+"""
+from sqlalchemy import inspect
+
+from app.database import engine
+
+with engine.begin() as conn:
+    columns = {column["name"] for column in inspect(conn).get_columns("users")}
+    if "unread_notifications_count" not in columns:
+        conn.exec_driver_sql("ALTER TABLE users ADD COLUMN unread_notifications_count INTEGER DEFAULT 0")
+        print("Added unread_notifications_count to users")
+
+    result = conn.exec_driver_sql("""
+        UPDATE users
+        SET unread_notifications_count = (SELECT COUNT(*) FROM notifications
+                                          WHERE notifications.recipient_id = users.id AND NOT notifications.is_read)
+        WHERE unread_notifications_count IS NOT (SELECT COUNT(*) FROM notifications
+                                                 WHERE notifications.recipient_id = users.id AND NOT notifications.is_read)
+    """)
+    print(f"Backfilled unread_notifications_count on {result.rowcount} users")
+
+print("Done!")
@@ -0,0 +1,56 @@
+"""
+Fill the tags and artifact_tags tables from each artifact's comma-separated
+tags, then recount Tag.artifacts_count.
+
+Safe to run again: existing tags and links are kept, and the recount also
+repairs counts that have drifted.
+"""
+from sqlalchemy import select, update, func
+
+from app.database import engine, Base, SessionLocal
+from app import models
+from app.tags import parse_tags, insert_ignoring_duplicates
+
+BATCH = 5000
+
+Base.metadata.create_all(bind=engine, tables=[models.Tag.__table__, models.ArtifactTag.__table__])
+
+db = SessionLocal()
+try:
+    rows = db.execute(select(models.Artifact.id, models.Artifact.tags).where(models.Artifact.tags.isnot(None))).all()
+    names = {}
+    links = []
+    for artifact_id, raw in rows:
+        for name in parse_tags(raw):
+            names.setdefault(name.lower(), name)
+            links.append((artifact_id, name.lower()))
+
+    slugs = list(names)
+    for start in range(0, len(slugs), BATCH):
+        insert_ignoring_duplicates(db, models.Tag, [{"slug": slug, "name": names[slug], "artifacts_count": 0}
+                                                    for slug in slugs[start:start + BATCH]])
+    tag_ids = dict(db.execute(select(models.Tag.slug, models.Tag.id)).all())
+    for start in range(0, len(links), BATCH):
+        insert_ignoring_duplicates(db, models.ArtifactTag, [{"artifact_id": artifact_id, "tag_id": tag_ids[slug]}
+                                                            for artifact_id, slug in links[start:start + BATCH]])
+    # Copied in SQL so the value matches artifacts.created_at exactly as stored.
+    db.execute(
+        update(models.ArtifactTag).where(models.ArtifactTag.created_at.is_(None))
+        .values(created_at=select(models.Artifact.created_at)
+                .where(models.Artifact.id == models.ArtifactTag.artifact_id).scalar_subquery())
+    )
+    print(f"Linked {len(rows)} artifacts to {len(slugs)} tags")
+
+    counts = (
+        select(func.count())
+        .where(models.ArtifactTag.tag_id == models.Tag.id)
+        .scalar_subquery()
+    )
+    result = db.execute(update(models.Tag).where(models.Tag.artifacts_count.is_distinct_from(counts))
+                        .values(artifacts_count=counts))
+    print(f"Recounted artifacts_count on {result.rowcount} tags")
+    db.commit()
+finally:
+    db.close()
+
+print("Done!")